@@ -0,0 +1,59 @@
+"""Crawl the local fixture shop with different fetch settings and report throughput.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_crawl --products 500 --latency 0.1
+"""
+import argparse
+import time
+
+import requests
+
+from app import scraper
+from app.benchmarks.fixture_shop import FixtureShop, start_fixture_shop
+from app.fetcher import Fetcher
+
+
+class BareFetcher:
+    """What the scraper did before: a fresh requests.get per page on 10 threads."""
+
+    max_connections = 10
+
+    def get(self, url):
+        return requests.get(url)
+
+
+def crawl(label, fetcher, server, base_url):
+    handler = server.RequestHandlerClass
+    handler.connections = handler.requests = 0
+    scraper.fetcher = fetcher
+    scraper.frontier.reset()
+    start = time.perf_counter()
+    products = scraper.scrape_all_collections(base_url)
+    elapsed = time.perf_counter() - start
+    print(f"{label:34} {elapsed:7.2f}s {handler.requests / elapsed:9.1f} pages/sec "
+          f"{handler.requests:7} requests {handler.connections:6} connections {len(products):6} products")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--collections", type=int, default=10)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.1, help="server seconds per response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of responses that are 429s")
+    args = parser.parse_args()
+
+    shop = FixtureShop(args.collections, args.products)
+    server, base_url = start_fixture_shop(shop, latency=args.latency, fail_rate=args.fail_rate)
+
+    if not args.fail_rate:
+        crawl("bare requests.get, 10 threads", BareFetcher(), server, base_url)
+    for connections in (8, 32, 64):
+        fetcher = Fetcher(max_connections=connections, max_per_host=connections, backoff=0.05)
+        crawl(f"pooled fetcher, {connections} in flight", fetcher, server, base_url)
+        print(f"{'':34} retries: {fetcher.retries}")
+        fetcher.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
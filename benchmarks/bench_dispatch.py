@@ -0,0 +1,52 @@
+"""Drive get_ai_response through the LLM dispatcher against the local stub OpenAI server.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_dispatch --clients 50 --questions 5 --fail-rate 0.2
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.benchmarks.stub_openai import start_stub_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50, help="concurrent callers")
+    parser.add_argument("--questions", type=int, default=5, help="distinct questions they ask")
+    parser.add_argument("--fail-rate", type=float, default=0.2, help="share of upstream calls answered 503")
+    parser.add_argument("--latency", type=float, default=0.5, help="stub seconds per completion")
+    parser.add_argument("--deadline", type=float, default=5.0)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(first_token_delay=args.latency, token_delay=0.0, fail_rate=args.fail_rate)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    from app import chat  # imported after the base URL is set so the client talks to the stub
+
+    chat.dispatcher.deadline = args.deadline
+    chat.response_cache.clear()
+    questions = [f"question number {i % args.questions}" for i in range(args.clients)]
+
+    def ask(question):
+        start = time.perf_counter()
+        answer = chat.get_ai_response(question)
+        return time.perf_counter() - start, answer == chat.FALLBACK_RESPONSE
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        results = list(executor.map(ask, questions))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    fallbacks = sum(1 for _, fell_back in results if fell_back)
+    print(f"{args.clients} callers, {args.questions} distinct questions, {elapsed:.2f}s wall")
+    print(f"upstream requests: {server.RequestHandlerClass.requests}  fallbacks: {fallbacks}")
+    print(f"latency p50 {statistics.median(latencies):.3f}s  max {latencies[-1]:.3f}s")
+    print(f"dispatcher: {chat.dispatcher.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare facet filtering in SQL over the typed columns with scanning and re-parsing every row.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_facets --products 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from app.benchmarks.catalog import build_catalog
+from app.connections import read_connection
+from app.database_management import PRODUCT_SELECT, facet_values, parse_price, search_by_facets
+from app.facets import get_facet_parser
+
+QUERIES = [
+    "red hoodies under 500 le in xl",
+    "navy jeans between 1000 and 2000 le",
+    "black or white t-shirts in xs",
+    "anything over 4,500 le",
+    "pink dress size m under 300",
+]
+RUNS = 5
+
+
+def legacy_filter(db_file, facets):
+    """What filtering needed before the typed columns: read every row and re-parse its strings."""
+    matches = []
+    for row in read_connection(db_file).execute(f"SELECT {PRODUCT_SELECT} FROM products p"):
+        price = float(row[2].replace("LE", "").replace(",", "").strip())
+        if facets.max_price is not None and price * 100 > facets.max_price:
+            continue
+        if facets.min_price is not None and price * 100 < facets.min_price:
+            continue
+        if facets.colors and not set(facet_values(row[4])) & set(facets.colors):
+            continue
+        if facets.sizes and not set(facet_values(row[5])) & set(facets.sizes):
+            continue
+        matches.append(row)
+    return matches
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        result = fn(*args)
+    return result, (time.perf_counter() - start) / RUNS * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "catalog.db")
+        build_catalog(db_file, args.products)
+        facet_parser = get_facet_parser(db_file)
+        mismatches = 0
+        for query in QUERIES:
+            facets = facet_parser.parse(query)
+            legacy, legacy_ms = timed(legacy_filter, db_file, facets)
+            typed, typed_ms = timed(search_by_facets, db_file, facets.colors, facets.sizes,
+                                    facets.min_price, facets.max_price, args.products)
+            same = {row[0] for row in legacy} == {row[0] for row in typed}
+            mismatches += not same
+            print(f"{query:38} scan {legacy_ms:8.1f} ms   sql {typed_ms:7.1f} ms   {len(typed):6} rows"
+                  f"{'' if same else '   MISMATCH'}")
+
+        cart = [{"price": row[2], "price_minor": row[8]} for row in search_by_facets(db_file, limit=50)]
+        _, parsed_us = timed(lambda: sum(parse_price(item["price"])[0] for item in cart))
+        _, typed_us = timed(lambda: sum(item["price_minor"] for item in cart))
+        print(f"50-item cart total: re-parsing prices {parsed_us * 1000:.0f} us, precomputed {typed_us * 1000:.0f} us")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
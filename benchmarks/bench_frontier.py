@@ -0,0 +1,104 @@
+"""Measure the crawl frontier: claim speed and memory per mode, then a killed and resumed crawl.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_frontier --urls 500000 --products 2000
+"""
+import argparse
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from app import scraper
+from app.benchmarks.fixture_shop import FixtureShop, start_fixture_shop
+from app.frontier import Frontier
+
+
+def synthetic_urls(count):
+    """Product URLs, each followed by a copy carrying Shopify search tracking parameters."""
+    for i in range(count):
+        url = f"https://shop.example.com/products/item-{i:08d}"
+        yield url
+        yield f"{url}?_pos={i % 24 + 1}&_sid=ab{i % 997}&_ss=r#reviews"
+
+
+def measure_claims(label, count, **frontier_args):
+    tracemalloc.start()
+    frontier = Frontier(**frontier_args)
+    start = time.perf_counter()
+    claimed = sum(1 for url in synthetic_urls(count) if frontier.claim(url) is not None)
+    frontier.checkpoint()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    frontier.close()
+    print(f"{label:22} {2 * count / elapsed:10,.0f} claims/sec  peak {peak / 2 ** 20:7.1f} MiB  "
+          f"{claimed:,} claimed, {count - claimed:,} new URLs missed")
+
+
+def count_rows(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    except sqlite3.Error:
+        return 0
+    finally:
+        conn.close()
+
+
+def crawl(base_url, db_file, frontier_file, resume):
+    frontier = Frontier(frontier_file, resume=resume)
+    count = scraper.stream_all_collections(base_url, scraper.DatabaseSink(db_file), frontier, batch_size=100)
+    frontier.close()
+    return count, frontier.skipped
+
+
+def resume_demo(products, latency):
+    shop = FixtureShop(10, products)
+    server, base_url = start_fixture_shop(shop, latency=latency)
+    handler = server.RequestHandlerClass
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file, frontier_file = os.path.join(tmp, "catalog.db"), os.path.join(tmp, "frontier.db")
+        child = subprocess.Popen(
+            [sys.executable, "-m", __spec__.name, "--child", base_url, db_file, frontier_file],
+            stdout=subprocess.DEVNULL,
+        )
+        while count_rows(db_file) < products // 2 and child.poll() is None:
+            time.sleep(0.05)
+        child.send_signal(signal.SIGKILL if hasattr(signal, "SIGKILL") else signal.SIGTERM)
+        child.wait()
+        before = count_rows(db_file)
+        print(f"crawl killed after {handler.requests} requests with {before} products stored")
+
+        handler.requests = 0
+        written, skipped = crawl(base_url, db_file, frontier_file, resume=True)
+        print(f"resumed: {handler.requests} requests, {skipped} finished pages skipped, {written} products written, "
+              f"{count_rows(db_file)} of {products} products stored")
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--urls", type=int, default=500_000)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--child", nargs=3, metavar=("BASE_URL", "DB", "FRONTIER"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        crawl(*args.child, resume=False)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        measure_claims("set", args.urls)
+        measure_claims("bloom filter, 0.1%", args.urls, bloom_capacity=args.urls)
+        measure_claims("sqlite", args.urls, db_file=os.path.join(tmp, "a.db"))
+        measure_claims("sqlite + bloom filter", args.urls, db_file=os.path.join(tmp, "b.db"), bloom_capacity=args.urls)
+    resume_demo(args.products, args.latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Compare catalog ingest throughput: the old per-row insert against batched upserts.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_ingest --products 200000
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import tempfile
+import time
+
+from app.benchmarks.catalog import write_catalog_csv
+from app.database_management import create_database, insert_products_from_csv
+
+
+def legacy_insert(db_file, csv_file):
+    """The original ingest: one execute per CSV row into a table without a url key."""
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, price TEXT, description TEXT,
+            colors TEXT, sizes TEXT, stock_status TEXT, url TEXT
+        );
+    """)
+    with open(csv_file, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            cursor.execute("""
+                INSERT OR IGNORE INTO products (name, price, description, colors, sizes, stock_status, url)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (row['name'], row['price'], row['description'], row['colors'], row['sizes'],
+                  row['stock_status'], row['url']))
+    conn.commit()
+    conn.close()
+
+
+def count_rows(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def timed(label, rows, fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:32} {elapsed:8.2f}s {rows / elapsed:12,.0f} rows/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, "products.csv")
+        write_catalog_csv(csv_file, args.products)
+
+        legacy_db = os.path.join(tmp, "legacy.db")
+        timed("old: execute per row", args.products, legacy_insert, legacy_db, csv_file)
+        legacy_insert(legacy_db, csv_file)
+        print(f"{'':32} rows after a second run: {count_rows(legacy_db):,}")
+
+        for label, bulk in (("new: batched upsert (WAL)", False), ("new: batched upsert, bulk", True)):
+            db_file = os.path.join(tmp, f"bulk-{bulk}.db")
+            create_database(db_file)
+            timed(label, args.products, insert_products_from_csv, db_file, csv_file, bulk=bulk)
+            timed("  re-run, nothing changed", args.products, insert_products_from_csv, db_file, csv_file, bulk=bulk)
+            print(f"{'':32} rows after a second run: {count_rows(db_file):,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Check the intent router against the regression corpus and time it against the old if-chain.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_intents
+"""
+import argparse
+import time
+
+from app.benchmarks.intent_corpus import CORPUS
+from app.intents import classify
+
+PRODUCT_FIELDS = ["name", "price", "description", "colors", "sizes", "stock_status", "url"]
+CART_CLEAR = ["reset my cart", "clear my cart", "empty my cart", "reset cart", "clear cart", "empty cart"]
+CART_VIEW = ["what is in my cart", "show my cart", "what's in my cart", "show cart", "view my cart", "view cart", "cart"]
+CART_ADD = ["add this product", "add it to the cart", "add it", "put it", "add to cart", "add to my cart"]
+SEARCH_KEYWORDS = ["price", "color", "product", "size", "availability", "buy", "order"]
+QUESTIONS = [
+    ("ask_sizes", ["do they have sizes", "what sizes are available", "available sizes", "sizes available",
+                   "what sizes do they have", "do they have this size", "is this size available", "what are the sizes"]),
+    ("ask_price", ["what is the price", "how much is it", "what's the price", "price of", "how much does it cost"]),
+    ("ask_colors", ["do they have colors", "what colors are available", "available colors", "colors available",
+                    "what colors do they have", "is this color available", "what are the colors"]),
+    ("ask_description", ["what is the description", "tell me about it", "describe this product", "what does it do",
+                         "can you describe it", "details about the product"]),
+    ("ask_link", ["where can I buy it", "give me the link", "product URL", "show me the website",
+                  "where is it listed", "can I see the link"]),
+]
+
+
+def legacy_classify(user_input):
+    """The chained substring checks chat() used to run, with a product selected."""
+    for key in PRODUCT_FIELDS:
+        if key in user_input:
+            return "product_field"
+    if any(user_input == phrase for phrase in CART_CLEAR):
+        return "cart_clear"
+    if any(user_input == phrase for phrase in CART_VIEW):
+        return "cart_view"
+    if any(phrase in user_input for phrase in CART_ADD):
+        return "cart_add"
+    if user_input == "next":
+        return "next_page"
+    if any(keyword in user_input for keyword in SEARCH_KEYWORDS) or len(user_input.split()) > 2:
+        return "search"
+    for intent, phrases in QUESTIONS:
+        if any(phrase in user_input for phrase in phrases):
+            return intent
+    return "fallback"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    failures = 0
+    for message, intent, search in CORPUS:
+        route = classify(message)
+        if (route.intent, route.search) != (intent, search):
+            failures += 1
+            print(f"MISMATCH {message!r}: expected {intent}/{search}, got {route.intent}/{route.search}")
+    print(f"Corpus: {len(CORPUS) - failures}/{len(CORPUS)} messages routed as expected")
+
+    messages = [message for message, _, _ in CORPUS] * args.rounds
+    for label, classifier in (("if-chain", legacy_classify), ("router", classify)):
+        start = time.perf_counter()
+        for message in messages:
+            classifier(message)
+        elapsed = time.perf_counter() - start
+        print(f"{label:9} {len(messages) / elapsed:12,.0f} msgs/sec  {elapsed / len(messages) * 1e6:6.2f} us/msg")
+
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
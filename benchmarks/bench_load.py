@@ -0,0 +1,249 @@
+"""Replay concurrent chat conversations against /get and report per-intent latency, throughput and memory.
+
+Builds a synthetic catalog, serves the app in-process with get_ai_response
+replaced by a fake of fixed latency, so it runs offline. Run from the
+directory containing the package:
+    python -m app.benchmarks.bench_load --products 20000 --clients 32 --json load.json
+
+With --url it drives an already running server instead (catalog and LLM are then that server's).
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from app.benchmarks.catalog import COLORS, ITEMS, MATERIALS, SIZES, STYLES, build_catalog
+
+FIELD_QUESTIONS = ["what sizes are available", "how much is it", "what colors do they have", "tell me about it",
+                   "give me the link"]
+FALLBACK_MESSAGES = ["hello", "thank you", "good morning", "hi there"]
+PRODUCT_PREFIX = "🛏️ "
+LLM_REPLY = "This is a stub answer. Our team will be happy to help with anything else."
+
+
+def peak_rss():
+    """Peak resident memory of this process in bytes."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(sorted_values, share):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * share // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def search_message(rng):
+    """A name search or a faceted search, worded the way shoppers type them."""
+    color, item = rng.choice(COLORS).lower(), rng.choice(ITEMS).lower()
+    kind = rng.random()
+    if kind < 0.4:
+        return "search", f"{color} {rng.choice(MATERIALS).lower()} {item}"
+    if kind < 0.7:
+        return "search", f"do you have any {rng.choice(STYLES).lower()} {item}"
+    return "facet_search", f"{color} {item} under {rng.randrange(5, 50) * 100} le in {rng.choice(SIZES).lower()}"
+
+
+def conversation(rng):
+    """Yield (intent, message) steps of one shopping session; product names are filled in from replies."""
+    for _ in range(rng.randint(1, 3)):
+        yield search_message(rng)
+        if rng.random() < 0.4:
+            yield "next", "next"
+        yield "select", None
+        for question in rng.sample(FIELD_QUESTIONS, rng.randint(0, 2)):
+            yield "ask_field", question
+        if rng.random() < 0.6:
+            yield "cart_add", "add it to the cart"
+        if rng.random() < 0.3:
+            yield "fallback", rng.choice(FALLBACK_MESSAGES)
+    yield "cart_view", "show my cart"
+    if rng.random() < 0.3:
+        yield "cart_clear", "clear my cart"
+
+
+class Client(threading.Thread):
+    """One shopper with its own cookie jar, replaying conversations until the deadline or request budget."""
+
+    def __init__(self, url, seed, deadline, budget):
+        super().__init__(daemon=True)
+        self.url = url
+        self.rng = random.Random(seed)
+        self.deadline = deadline
+        self.budget = budget
+        self.samples = []        # (intent, seconds, ok)
+        self.cookie_sizes = []   # (request number in its session, session cookie bytes)
+
+    def post(self, http, intent, message, number):
+        start = time.perf_counter()
+        try:
+            response = http.post(self.url, data={"msg": message}, timeout=60)
+            ok = response.status_code == 200
+            reply = response.json().get("response", "") if ok else ""
+        except (requests.RequestException, ValueError):
+            ok, reply = False, ""
+        self.samples.append((intent, time.perf_counter() - start, ok))
+        self.cookie_sizes.append((number, len(http.cookies.get("session") or "")))
+        return reply
+
+    def run(self):
+        while self.budget > 0 and time.perf_counter() < self.deadline:
+            with requests.Session() as http:
+                products = []
+                number = 0
+                for intent, message in conversation(self.rng):
+                    if self.budget <= 0 or time.perf_counter() >= self.deadline:
+                        return
+                    if intent == "select":
+                        if not products:
+                            continue
+                        message = self.rng.choice(products).lower()
+                    number += 1
+                    self.budget -= 1
+                    reply = self.post(http, intent, message, number)
+                    if intent in ("search", "facet_search", "next"):
+                        products = [line[len(PRODUCT_PREFIX):] for line in reply.splitlines()
+                                    if line.startswith(PRODUCT_PREFIX)] or products
+
+
+def serve_app(database_path, llm_latency):
+    """Serve the app on a local threaded server against `database_path`, with the LLM faked."""
+    from werkzeug.serving import make_server
+
+    from app import chat, routes
+    from app.run import app
+
+    def fake_ai_response(user_input, **context):
+        time.sleep(llm_latency)
+        return LLM_REPLY
+
+    routes.DATABASE_PATH = database_path
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no access log line per request
+    routes.get_ai_response = chat.get_ai_response = fake_ai_response
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/get"
+
+
+def summarize(clients, elapsed):
+    samples = [sample for client in clients for sample in client.samples]
+    intents = {}
+    for intent in sorted({intent for intent, _, _ in samples}):
+        latencies = sorted(seconds * 1000 for name, seconds, _ in samples if name == intent)
+        intents[intent] = {
+            "requests": len(latencies),
+            "errors": sum(1 for name, _, ok in samples if name == intent and not ok),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2),
+        }
+    all_latencies = sorted(seconds * 1000 for _, seconds, _ in samples)
+    cookies = [entry for client in clients for entry in client.cookie_sizes]
+    by_number = {}
+    for number, size in cookies:
+        by_number.setdefault(number, []).append(size)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "p50_ms": round(percentile(all_latencies, 50), 2),
+        "p95_ms": round(percentile(all_latencies, 95), 2),
+        "p99_ms": round(percentile(all_latencies, 99), 2),
+        "intents": intents,
+        "cookie_bytes": {
+            "max": max(size for _, size in cookies),
+            # Mean session cookie size after the 1st, 2nd, ... request of a conversation
+            "mean_by_request": [round(sum(sizes) / len(sizes), 1) for _, sizes in sorted(by_number.items())],
+        },
+    }
+
+
+def print_report(result):
+    print(f"{result['requests']} requests in {result['seconds']:.1f}s: {result['throughput_rps']:.1f} req/s, "
+          f"{result['errors']} errors, p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+          f"p99 {result['p99_ms']:.1f} ms")
+    print(f"{'intent':14} {'requests':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for intent, stats in result["intents"].items():
+        print(f"{intent:14} {stats['requests']:9} {stats['errors']:7} {stats['p50_ms']:9.1f} {stats['p95_ms']:9.1f} "
+              f"{stats['p99_ms']:9.1f} {stats['max_ms']:9.1f}")
+    growth = result["cookie_bytes"]["mean_by_request"]
+    print(f"session cookie: {growth[0]:.0f} bytes after request 1, {max(growth):.0f} at most on average "
+          f"(after request {growth.index(max(growth)) + 1}), largest {result['cookie_bytes']['max']}")
+    if result.get("peak_rss_mib") is not None:
+        print(f"peak RSS: {result['peak_rss_mib']:.1f} MiB (server and clients share the process)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent shoppers")
+    parser.add_argument("--requests", type=int, default=3000, help="total requests across all clients")
+    parser.add_argument("--duration", type=float, default=120.0, help="stop after this many seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds the fake get_ai_response takes")
+    parser.add_argument("--db", help="catalog file to (re)build; a temporary ecommerce_products.db by default")
+    parser.add_argument("--url", help="drive this running /get endpoint instead of an in-process app")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url = args.url
+    else:
+        database_path = args.db or os.path.join(tempfile.mkdtemp(), "ecommerce_products.db")
+        start = time.perf_counter()
+        build_catalog(database_path, args.products, args.seed)
+        print(f"built {args.products} products in {time.perf_counter() - start:.1f}s")
+        server, url = serve_app(database_path, args.llm_latency)
+
+    # One search first so the per-worker index build is not counted against the first shoppers
+    start = time.perf_counter()
+    requests.post(url, data={"msg": "red cotton hoodie"}, timeout=600)
+    warmup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    budgets = [args.requests // args.clients + (i < args.requests % args.clients) for i in range(args.clients)]
+    clients = [Client(url, args.seed * 1000 + i, deadline, budget) for i, budget in enumerate(budgets)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    result = summarize(clients, time.perf_counter() - start)
+    result["warmup_seconds"] = round(warmup, 3)
+    result["peak_rss_mib"] = None if args.url else round(peak_rss() / 2 ** 20, 1)
+    result["config"] = {
+        "products": None if args.url else args.products, "clients": args.clients, "requests": args.requests,
+        "llm_latency": None if args.url else args.llm_latency, "seed": args.seed,
+        "python": platform.python_version(), "platform": platform.platform(),
+    }
+    if server is not None:
+        server.shutdown()
+
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2, sort_keys=True)
+            file.write("\n")
+        print(f"results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
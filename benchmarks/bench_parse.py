@@ -0,0 +1,69 @@
+"""Parse saved product pages with each parser backend, check they agree, and report pages/sec.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_parse --generated 2000 --processes 4
+"""
+import argparse
+import os
+import sys
+import time
+
+from app.benchmarks.catalog import generate_products
+from app.benchmarks.fixture_shop import render_product
+from app.page_parser import BACKENDS, ProductParser
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_pages(fixture_dir, generated):
+    """Saved .html fixtures, read as the scraper would see response.text, plus rendered fixture shop pages."""
+    pages = []
+    for name in sorted(os.listdir(fixture_dir)):
+        if name.endswith(".html"):
+            with open(os.path.join(fixture_dir, name), encoding="utf-8", newline="") as f:
+                pages.append((f.read(), f"https://shop.example.com/products/{name[:-5]}"))
+    pages.extend((render_product(p), p["url"]) for p in generate_products(generated))
+    return pages
+
+
+def run(label, parser, pages):
+    list(parser.map(pages[:50]))  # starts worker processes and warms their imports
+    start = time.perf_counter()
+    products = list(parser.map(pages))
+    elapsed = time.perf_counter() - start
+    print(f"{label:28} {elapsed:7.2f}s {len(pages) / elapsed:9.0f} pages/sec")
+    return products
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="directory of saved product pages")
+    parser.add_argument("--generated", type=int, default=2000, help="fixture shop pages to add")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    pages = load_pages(args.fixtures, args.generated)
+    print(f"{len(pages)} pages, {sum(len(html) for html, _ in pages) / 2 ** 20:.1f} MiB of HTML")
+    expected = run("bs4 (html.parser)", ProductParser("bs4"), pages)
+    mismatches = 0
+    for backend in BACKENDS:
+        for processes in (0, args.processes):
+            if backend == "bs4" and not processes:
+                continue
+            product_parser = ProductParser(backend, processes)
+            products = run(f"{backend}, {processes} processes" if processes else backend, product_parser, pages)
+            product_parser.close()
+            for (html, url), want, got in zip(pages, expected, products):
+                if want != got:
+                    mismatches += 1
+                    if mismatches <= 5:
+                        print(f"  {backend} differs on {url}:")
+                        for field in want:
+                            if want[field] != got[field]:
+                                print(f"    {field}: {want[field]!r} != {got[field]!r}")
+    print("all backends agree" if not mismatches else f"{mismatches} mismatching pages")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
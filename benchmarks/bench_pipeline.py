@@ -0,0 +1,94 @@
+"""Compare the batch crawl (crawl, CSV, ingest) with the pipelined crawl straight into the database.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_pipeline --products 1000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from app import scraper
+from app.benchmarks.fixture_shop import FixtureShop, start_fixture_shop
+from app.database_management import create_database, insert_products_from_csv
+
+
+class FirstRowWatch:
+    """Polls a database from another thread and notes when the first product row becomes visible."""
+
+    def __init__(self, db_file, interval=0.05):
+        self.db_file = db_file
+        self.interval = interval
+        self.seen_at = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            conn = sqlite3.connect(self.db_file)
+            try:
+                if conn.execute("SELECT 1 FROM products LIMIT 1").fetchone():
+                    self.seen_at = time.perf_counter() - self.started
+                    return
+            except sqlite3.Error:
+                pass
+            finally:
+                conn.close()
+
+
+def batch_crawl(base_url, db_file, csv_file):
+    scraper.frontier.reset()
+    products = scraper.scrape_all_collections(base_url)
+    scraper.export_to_csv(products, csv_file)
+    return insert_products_from_csv(db_file, csv_file)
+
+
+def pipelined_crawl(base_url, db_file):
+    return scraper.stream_all_collections(base_url, scraper.DatabaseSink(db_file))
+
+
+def measure(label, db_file, fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    with FirstRowWatch(db_file) as watch:
+        count = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    first = f"{watch.seen_at:6.2f}s" if watch.seen_at is not None else " at end"
+    print(f"{label:28} {elapsed:7.2f}s total  first row after {first}  "
+          f"peak {peak / 2 ** 20:7.1f} MiB  {count:7} products")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--collections", type=int, default=10)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0, help="server seconds per response")
+    args = parser.parse_args()
+
+    shop = FixtureShop(args.collections, args.products)
+    server, base_url = start_fixture_shop(shop, latency=args.latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        batch_db, pipeline_db = os.path.join(tmp, "batch.db"), os.path.join(tmp, "pipeline.db")
+        create_database(batch_db)
+        measure("crawl, CSV, then ingest", batch_db, batch_crawl, base_url, batch_db, os.path.join(tmp, "products.csv"))
+        create_database(pipeline_db)
+        measure("pipelined into the database", pipeline_db, pipelined_crawl, base_url, pipeline_db)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Compare the bare and the catalog-grounded LLM prompts on conversations replayed against the stub OpenAI server.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_prompts --products 20000 --sessions 40 --answer-words 300
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app.benchmarks.catalog import COLORS, ITEMS, MATERIALS, build_catalog
+from app.benchmarks.stub_openai import start_stub_server
+
+# Two-word or shorter messages that no rule answers, so they go to the LLM
+LLM_MESSAGES = ["hello", "thank you", "winter jackets", "hoodies", "machine washable", "gift ideas", "for kids", "warm enough"]
+PRODUCT_PREFIX = "🛏️ "
+LEGACY_SYSTEM_PROMPT = ("You are a helpful e-commerce chatbot that can answer questions about products and gives a "
+                        "genaric description when asked on any product.")
+
+
+def legacy_messages(user_input, *context):
+    """The prompt get_ai_response sent before: the system prompt and the raw message."""
+    return [{"role": "system", "content": LEGACY_SYSTEM_PROMPT}, {"role": "user", "content": user_input}]
+
+
+def replay(client, rng, sessions, stub, cache):
+    """Run shopping sessions that each end in two LLM questions; returns [(seconds, request body, answer)].
+
+    The response cache is emptied before every question, so each one reaches the stub.
+    """
+    calls = []
+    for _ in range(sessions):
+        client.delete_cookie("session")
+        query = f"{rng.choice(COLORS).lower()} {rng.choice(MATERIALS).lower()} {rng.choice(ITEMS).lower()}"
+        reply = client.post("/get", data={"msg": query}).get_json()["response"]
+        names = [line[len(PRODUCT_PREFIX):] for line in reply.splitlines() if line.startswith(PRODUCT_PREFIX)]
+        if names:
+            client.post("/get", data={"msg": rng.choice(names).lower()})
+        for message in rng.sample(LLM_MESSAGES, 2):
+            cache.clear()
+            start = time.perf_counter()
+            answer = client.post("/get", data={"msg": message}).get_json()["response"]
+            calls.append((time.perf_counter() - start, stub.bodies[-1], answer))
+    return calls
+
+
+def report(label, calls):
+    latencies = sorted(seconds for seconds, _, _ in calls)
+    prompt_tokens = sorted(sum(len(m["content"]) for m in body["messages"]) // 4 for _, body, _ in calls)
+    answer_words = [len(answer.split()) for _, _, answer in calls]
+    grounded = sum(1 for _, body, _ in calls if "Catalog:" in body["messages"][0]["content"])
+    history = statistics.mean(len(body["messages"]) - 2 for _, body, _ in calls)
+    print(f"{label:9} {len(calls):4} calls  prompt ~{statistics.median(prompt_tokens):5.0f} tokens "
+          f"(max {prompt_tokens[-1]:4})  answer {statistics.median(answer_words):5.0f} words  "
+          f"latency p50 {statistics.median(latencies) * 1000:6.0f} ms  p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.0f} ms  "
+          f"grounded {grounded:3}/{len(calls)}  history {history:.1f} messages")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--answer-words", type=int, default=300, help="words the stub answers with when not cut off")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="stub seconds per answer word")
+    args = parser.parse_args()
+
+    stub, base_url = start_stub_server(first_token_delay=0.1, token_delay=args.token_delay,
+                                       answer_words=args.answer_words, bodies=[])
+    os.environ["OPENAI_BASE_URL"] = base_url
+    from app import chat, routes  # imported after the base URL is set so the client talks to the stub
+    from app.run import app
+
+    database_path = os.path.join(tempfile.mkdtemp(), "ecommerce_products.db")
+    build_catalog(database_path, args.products)
+    routes.DATABASE_PATH = database_path
+    client = app.test_client()
+    client.post("/get", data={"msg": "red cotton hoodie"})  # builds the search index
+
+    grounded = (chat.build_messages, chat.MAX_COMPLETION_TOKENS, routes.llm_context)
+    chat.build_messages, chat.MAX_COMPLETION_TOKENS, routes.llm_context = legacy_messages, None, lambda user_input: {}
+    report("before", replay(client, random.Random(0), args.sessions, stub.RequestHandlerClass, chat.response_cache))
+    chat.build_messages, chat.MAX_COMPLETION_TOKENS, routes.llm_context = grounded
+    report("grounded", replay(client, random.Random(0), args.sessions, stub.RequestHandlerClass, chat.response_cache))
+    print(f"prompt budget {chat.PROMPT_TOKEN_BUDGET} tokens, answers capped at {chat.MAX_COMPLETION_TOKENS} tokens")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Compare a full crawl and ingest against incremental recrawls of the local fixture shop.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_recrawl --products 2000 --change-rate 0.02
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from app import scraper
+from app.benchmarks.fixture_shop import FixtureShop, start_fixture_shop
+from app.crawl_state import CrawlState
+from app.database_management import create_database, delete_products_by_url, insert_products_from_csv, upsert_products
+
+
+def reset(handler):
+    handler.connections = handler.requests = handler.not_modified = 0
+
+
+def report(label, elapsed, handler, changed, removed):
+    print(f"{label:36} {elapsed:7.2f}s {handler.requests:7} requests {handler.not_modified:6} x 304 "
+          f"{changed:6} changed {removed:5} removed")
+
+
+def full_refresh(base_url, db_file, csv_file):
+    scraper.frontier.reset()
+    products = scraper.scrape_all_collections(base_url)
+    scraper.export_to_csv(products, csv_file)
+    insert_products_from_csv(db_file, csv_file)
+    return len(products)
+
+
+def incremental_refresh(base_url, db_file, state_file):
+    state = CrawlState(state_file)
+    changed, removed = scraper.scrape_incremental(base_url, state)
+    upsert_products(db_file, changed)
+    delete_products_by_url(db_file, removed)
+    state.save()
+    return changed, removed
+
+
+def edit_shop(shop, change_rate, seed=1):
+    """Reprice a share of the products and take down half as many; returns (changed paths, removed paths)."""
+    rng = random.Random(seed)
+    paths = sorted(shop.products)
+    count = max(1, int(len(paths) * change_rate))
+    picked = rng.sample(paths, count + count // 2)
+    changed, removed = set(), set()
+    for path in picked[:count]:
+        shop.update_product(path, price=f"LE {rng.randint(100, 5000)}.00")
+        changed.add(path)
+    for path in picked[count:]:
+        removed.add(path)
+        shop.remove_product(path)
+    return changed, removed
+
+
+def rows(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return set(conn.execute("SELECT name, price, description, colors, sizes, stock_status, url FROM products"))
+    finally:
+        conn.close()
+
+
+def paths(urls):
+    return {urlparse(url).path for url in urls}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--collections", type=int, default=10)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--change-rate", type=float, default=0.02, help="share of products repriced between crawls")
+    parser.add_argument("--latency", type=float, default=0.0, help="server seconds per response")
+    args = parser.parse_args()
+
+    shop = FixtureShop(args.collections, args.products)
+    server, base_url = start_fixture_shop(shop, latency=args.latency)
+    handler = server.RequestHandlerClass
+    with tempfile.TemporaryDirectory() as tmp:
+        full_db, incremental_db = os.path.join(tmp, "full.db"), os.path.join(tmp, "incremental.db")
+        state_file = os.path.join(tmp, "state.db")
+        create_database(full_db)
+        create_database(incremental_db)
+
+        reset(handler)
+        start = time.perf_counter()
+        count = full_refresh(base_url, full_db, os.path.join(tmp, "products.csv"))
+        report("full crawl + CSV + ingest", time.perf_counter() - start, handler, count, 0)
+
+        reset(handler)
+        start = time.perf_counter()
+        changed, removed = incremental_refresh(base_url, incremental_db, state_file)
+        report("incremental, first run", time.perf_counter() - start, handler, len(changed), len(removed))
+
+        reset(handler)
+        start = time.perf_counter()
+        changed, removed = incremental_refresh(base_url, incremental_db, state_file)
+        report("incremental, nothing changed", time.perf_counter() - start, handler, len(changed), len(removed))
+
+        expected_changed, expected_removed = edit_shop(shop, args.change_rate)
+        reset(handler)
+        start = time.perf_counter()
+        changed, removed = incremental_refresh(base_url, incremental_db, state_file)
+        report("incremental, after edits", time.perf_counter() - start, handler, len(changed), len(removed))
+        ok = paths(p["url"] for p in changed) == expected_changed and paths(removed) == expected_removed
+        all_removed = set(expected_removed)
+
+        # A server without validators: every page comes back, but unchanged bodies are not parsed
+        handler.validators = False
+        expected_changed, expected_removed = edit_shop(shop, args.change_rate, seed=2)
+        reset(handler)
+        start = time.perf_counter()
+        changed, removed = incremental_refresh(base_url, incremental_db, state_file)
+        report("incremental, edits, no ETag/LM", time.perf_counter() - start, handler, len(changed), len(removed))
+        ok = ok and paths(p["url"] for p in changed) == expected_changed and paths(removed) == expected_removed
+        all_removed |= expected_removed
+
+        full_refresh(base_url, full_db, os.path.join(tmp, "products.csv"))
+        # A full crawl never removes rows, so take the removed products out by hand
+        delete_products_by_url(full_db, [base_url + path for path in all_removed])
+        print("catalogs match" if ok and rows(full_db) == rows(incremental_db) else "MISMATCH")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
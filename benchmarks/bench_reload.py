@@ -0,0 +1,90 @@
+"""Catalog lookup latency while an ingest changes the catalog, with blocking and background index rebuilds.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_reload --products 100000 --clients 8
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from app.benchmarks.catalog import build_catalog, generate_products
+from app.database_management import upsert_products
+from app.search_index import build_search_index, catalog_version, get_search_index
+
+
+
+class BlockingIndex:
+    """What get_search_index did before: the first request to see a new version rebuilds while everyone waits."""
+
+    def __init__(self):
+        self.index = None
+        self.lock = threading.Lock()
+
+    def get(self, database_path):
+        version = catalog_version(database_path)
+        if self.index is not None and self.index.version == version:
+            return self.index
+        with self.lock:
+            if self.index is None or self.index.version != version:
+                self.index = build_search_index(database_path, version)
+        return self.index
+
+
+def run(label, get_index, database_path, clients, changed, seconds):
+    get_index(database_path)  # built before the clock starts, as after a restart
+    stop = threading.Event()
+    latencies = []
+    swapped = []
+
+    def client(number):
+        rng = random.Random(number)
+        while not stop.is_set():
+            # The selected-product lookup every /get makes, so the time is the wait for the index
+            start = time.perf_counter()
+            index = get_index(database_path)
+            index.get(rng.randint(1, len(index)))
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.001)
+            if not swapped and index.version == catalog_version(database_path) and index.version != first_version:
+                swapped.append(time.perf_counter())
+
+    first_version = get_index(database_path).version
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds / 3)
+    written = time.perf_counter()
+    upsert_products(database_path, changed)
+    time.sleep(seconds * 2 / 3)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    visible = f"{swapped[0] - written:6.2f}s" if swapped else "   never"
+    print(f"{label:22} {len(latencies):7} lookups  p50 {latencies[len(latencies) // 2] * 1000:7.1f} ms  "
+          f"p99 {p99 * 1000:7.1f} ms  max {latencies[-1] * 1000:7.1f} ms  new catalog served after {visible}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--changed", type=int, default=1000, help="products the ingest rewrites")
+    parser.add_argument("--seconds", type=float, default=15.0)
+    args = parser.parse_args()
+
+    database_path = os.path.join(tempfile.mkdtemp(), "ecommerce_products.db")
+    build_catalog(database_path, args.products)
+    for label, get_index in (("blocking rebuild", BlockingIndex().get), ("background rebuild", get_search_index)):
+        # Another seed gives other products, so every run really changes the catalog
+        changed = list(generate_products(args.changed, seed=int(time.time())))
+        run(label, get_index, database_path, args.clients, changed, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
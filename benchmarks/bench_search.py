@@ -0,0 +1,100 @@
+"""Compare the trigram search index and the FTS5 backend against the full-table fuzzy scan.
+
+Recall is the share of the scan's matches the index finds, which should be
+all of them, in the scan's order; the FTS5 backend only reranks its bm25
+candidates, so for it only the top k are compared.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_search --products 100000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from fuzzywuzzy import fuzz
+
+from app.benchmarks.catalog import build_catalog
+from app.database_management import create_search_index, search_products
+from app.search_index import get_search_index, rank_products, score_product
+
+QUERIES = [
+    "red hoodie",
+    "do you have any oversized denim jackets",
+    "linen bed sheet",
+    "slim fit blazr",
+    "something in velvet",
+    "pajama set for winter",
+    "classic white t-shirt 000042",
+    "swetpants",
+    "hodie",
+    "blak jeans",
+]
+
+
+def full_scan(database_path, query):
+    """The original route search: load every row and fuzzy score all of them."""
+    connection = sqlite3.connect(database_path)
+    cursor = connection.cursor()
+    cursor.execute("SELECT * FROM products")
+    all_products = cursor.fetchall()
+    connection.close()
+
+    matches = []
+    for product in all_products:
+        name_match = fuzz.partial_ratio(query.lower(), product[1].lower())
+        description_match = fuzz.partial_ratio(query.lower(), product[3].lower())
+        if name_match > 52 or description_match > 52:
+            matches.append((name_match + description_match, product))
+
+    matches.sort(reverse=True, key=lambda x: x[0])
+    return [match[1] for match in matches]
+
+
+def top_scores(query, products, k):
+    """Scores of the first k products; ties make row identity depend on retrieval order."""
+    query = query.lower()
+    return [score_product(query, p[1].lower(), p[3].lower()) for p in products[:k]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "catalog.db")
+        build_catalog(db_file, args.products)
+        create_search_index(db_file)
+
+        start = time.perf_counter()
+        index = get_search_index(db_file)
+        print(f"Index build for {len(index)} products: {time.perf_counter() - start:.2f}s")
+        print(f"{'query':45} {'scan ms':>9} {'index ms':>9} {'scored':>8} {'matches':>15} {'recall':>7} {'fts ms':>9}  same scores: index all/fts top-{args.top_k}")
+
+        for query in QUERIES:
+            start = time.perf_counter()
+            expected = full_scan(db_file, query)
+            scan_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            results = index.search(query)
+            index_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            fts_results = rank_products(query, search_products(db_file, query))
+            fts_ms = (time.perf_counter() - start) * 1000
+
+            scored = len(index.candidates(query.lower()))
+            found = {product[0] for product in results} & {product[0] for product in expected}
+            recall = len(found) / len(expected) if expected else 1.0
+            same = top_scores(query, results, len(results)) == top_scores(query, expected, len(expected))
+            fts_same = top_scores(query, fts_results, args.top_k) == top_scores(query, expected, args.top_k)
+            print(f"{query:45} {scan_ms:9.1f} {index_ms:9.1f} {scored:8} {len(results):7}/{len(expected):<7}"
+                  f" {recall:7.0%} {fts_ms:9.1f}  {same}/{fts_same}")
+
+
+if __name__ == "__main__":
+    main()
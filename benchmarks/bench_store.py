@@ -0,0 +1,129 @@
+"""Memory and speed of the catalog as tuple rows, as a columnar ProductStore and as a memory-mapped snapshot.
+
+Run from the directory containing the package:
+    python -m app.benchmarks.bench_store --products 100000
+"""
+import argparse
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from app.benchmarks.catalog import build_catalog
+from app.product_store import ProductStore, open_snapshot, write_snapshot
+from app.search_index import SearchIndex, load_products
+
+QUERY = "red cotton hoodie"
+
+
+def traced(build):
+    """Run `build`; returns (result, bytes it still holds, seconds without tracing)."""
+    start = time.perf_counter()
+    build()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, retained, seconds
+
+
+def private_kib():
+    with open("/proc/self/smaps_rollup") as file:
+        return sum(int(line.split()[1]) for line in file if line.startswith(("Private_Clean", "Private_Dirty")))
+
+
+def private_after_reading(products):
+    """KiB a forked worker turns private by reading every product once, as searches do; None off Linux."""
+    if not hasattr(os, "fork") or not os.path.exists("/proc/self/smaps_rollup"):
+        return None
+    gc.collect()
+    gc.freeze()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        before = private_kib()
+        for product in products:
+            product[1]
+        os.write(write, str(private_kib() - before).encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    grown = int(os.read(read, 64))
+    os.close(read)
+    os.close(write)
+    gc.unfreeze()
+    return grown
+
+
+def lookup_us(get, ids):
+    start = time.perf_counter()
+    for product_id in ids:
+        get(product_id)
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+def report(label, retained, count, extra=""):
+    print(f"{label:28} {retained / 2 ** 20:8.1f} MiB  {retained / count:6.0f} B/product  {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database_path = os.path.join(directory, "ecommerce_products.db")
+    build_catalog(database_path, args.products)
+    count = args.products
+    ids = [random.randrange(1, count + 1) for _ in range(args.lookups)]
+
+    print(f"{count} products; heap held by each representation, traced with tracemalloc")
+    (rows, columns), retained, seconds = traced(lambda: load_products(database_path))
+    offsets = {row[0]: offset for offset, row in enumerate(rows)}
+    report("tuple rows (SELECT *)", retained, count,
+           f"load {seconds:5.2f}s  get {lookup_us(lambda i: rows[offsets[i]], ids):.2f} us")
+
+    store, retained, seconds = traced(lambda: ProductStore.from_rows(rows, columns))
+    report("ProductStore", retained, count, f"build {seconds:5.2f}s  get {lookup_us(store.get, ids):.2f} us")
+
+    store_path = os.path.join(directory, "products.store")
+    kinds, sections = store.snapshot_parts()
+    write_snapshot(store_path, {"columns": kinds}, sections)
+
+    def open_store():
+        header, sections = open_snapshot(store_path)
+        return ProductStore.from_snapshot(header["columns"], sections)
+
+    mapped_store, retained, seconds = traced(open_store)
+    report("mapped ProductStore", retained, count,
+           f"open {seconds * 1000:5.1f}ms  get {lookup_us(mapped_store.get, ids):.2f} us  "
+           f"file {os.path.getsize(store_path) / 2 ** 20:.1f} MiB")
+
+    print("\nwhole search index (rows, lowercased texts and trigram postings)")
+    index, retained, seconds = traced(lambda: SearchIndex(rows, columns))
+    start = time.perf_counter()
+    index.search(QUERY)
+    report("SearchIndex", retained, count, f"build {seconds:5.2f}s  search {time.perf_counter() - start:5.2f}s")
+
+    index_path = os.path.join(directory, "products.index")
+    index.save(index_path)
+    mapped, retained, seconds = traced(lambda: SearchIndex.open(index_path))
+    start = time.perf_counter()
+    found = mapped.search(QUERY)
+    report("mapped SearchIndex", retained, count,
+           f"open {seconds * 1000:5.1f}ms  search {time.perf_counter() - start:5.2f}s  "
+           f"file {os.path.getsize(index_path) / 2 ** 20:.1f} MiB  same results {found == index.search(QUERY)}")
+
+    print("\nmemory a forked worker makes private by reading every product once")
+    for label, products in (("tuple rows", rows), ("ProductStore", store), ("mapped ProductStore", mapped_store)):
+        grown = private_after_reading(products)
+        print(f"{label:28} {'n/a' if grown is None else f'{grown / 1024:8.1f} MiB'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Synthetic product catalogs for the benchmark scripts."""
+import csv
+import random
+import sqlite3
+
+from app.database_management import create_database, upsert_products
+
+COLORS = ["Black", "White", "Red", "Navy", "Olive", "Beige", "Grey", "Burgundy", "Mustard", "Pink"]
+MATERIALS = ["Cotton", "Linen", "Denim", "Wool", "Fleece", "Leather", "Satin", "Jersey", "Velvet", "Silk"]
+ITEMS = [
+    "Hoodie", "T-Shirt", "Jacket", "Sweatpants", "Jeans", "Dress", "Skirt", "Blazer", "Cardigan",
+    "Shorts", "Polo Shirt", "Coat", "Pajama Set", "Bed Sheet", "Pillow Case", "Duvet Cover",
+]
+STYLES = ["Classic", "Oversized", "Slim Fit", "Relaxed", "Cropped", "Vintage", "Essential", "Premium"]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+PHRASES = [
+    "Made from soft breathable {material}",
+    "A {style} cut that works for every season",
+    "Finished with reinforced stitching",
+    "Machine washable and easy to care for",
+    "Pairs well with our {color} essentials",
+    "Designed and produced locally",
+]
+
+
+def generate_products(count, seed=0):
+    """Yield `count` product dicts shaped like the scraper's output."""
+    rng = random.Random(seed)
+    for number in range(count):
+        color = rng.choice(COLORS)
+        material = rng.choice(MATERIALS)
+        item = rng.choice(ITEMS)
+        style = rng.choice(STYLES)
+        phrases = rng.sample(PHRASES, 3)
+        description = ". ".join(p.format(material=material.lower(), style=style.lower(), color=color.lower()) for p in phrases)
+        price = rng.randrange(150, 5000)
+        yield {
+            "name": f"{style} {color} {material} {item} {number:06d}",
+            "price": f"LE {price:,}.00",
+            "description": f"{description}.",
+            "colors": ", ".join(sorted(rng.sample(COLORS, rng.randint(1, 4)))),
+            "sizes": ", ".join(SIZES[rng.randint(0, 2):rng.randint(3, 6)]),
+            "stock_status": "Out of Stock" if rng.random() < 0.1 else "In Stock",
+            "url": f"https://shop.example.com/products/{item.lower().replace(' ', '-')}-{number:06d}",
+        }
+
+
+def build_catalog(db_file, count, seed=0):
+    """Create `db_file` and fill its products table with a synthetic catalog."""
+    create_database(db_file)
+    conn = sqlite3.connect(db_file)
+    with conn:
+        conn.execute("DELETE FROM products")
+    conn.close()
+    upsert_products(db_file, generate_products(count, seed))
+
+
+def write_catalog_csv(csv_file, count, seed=0):
+    """Write a synthetic catalog in the scraper's CSV export format."""
+    fields = ["name", "price", "description", "colors", "sizes", "stock_status", "url"]
+    with open(csv_file, mode="w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(generate_products(count, seed))
@@ -0,0 +1,214 @@
+"""A local Shopify-like storefront for exercising the scraper offline.
+
+    python -m app.benchmarks.fixture_shop --port 8002 --collections 20 --products 2000
+"""
+import argparse
+import gzip
+import hashlib
+import html
+import random
+import sys
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from app.benchmarks.catalog import generate_products
+
+# Navigation, scripts and footer that real theme pages carry around the product markup
+PAGE_CHROME = "".join(
+    f'<li class="site-nav__item"><a class="site-nav__link" href="/pages/info-{i}">Info {i}</a></li>' for i in range(60)
+)
+
+
+def render_home(collection_slugs):
+    links = "".join(f'<a href="/collections/{slug}">{slug.title()}</a>' for slug in collection_slugs)
+    return f"<html><head><title>Shop</title></head><body><ul>{PAGE_CHROME}</ul><nav>{links}</nav></body></html>"
+
+
+def render_collection(products):
+    cards = "".join(
+        f'<div class="grid-product"><a class="grid-product__link" href="{urlparse(p["url"]).path}">'
+        f'<span class="grid-product__title">{html.escape(p["name"])}</span></a></div>'
+        for p in products
+    )
+    return f"<html><body><ul>{PAGE_CHROME}</ul><div class=\"grid\">{cards}</div></body></html>"
+
+
+def render_product(product):
+    swatches = "".join(
+        f'<div class="swatch__element" data-value="{html.escape(color)}"></div>'
+        for color in product["colors"].split(", ") if color
+    )
+    options = "".join(f"<option>{html.escape(size)}</option>" for size in product["sizes"].split(", ") if size)
+    button = "Sold Out" if product["stock_status"] == "Out of Stock" else "Add to Cart"
+    return (
+        f"<html><head><title>{html.escape(product['name'])}</title></head><body><ul>{PAGE_CHROME}</ul>"
+        f'<div class="product-single"><h1 class="product-single__title">{html.escape(product["name"])}</h1>'
+        f'<span class="product__price"><span class="money">{html.escape(product["price"])}</span></span>'
+        f'<div class="swatches">{swatches}</div>'
+        f"<select data-single-option-selector>{options}</select>"
+        f'<button><span data-add-to-cart-text>{button}</span></button>'
+        f'<div class="product-single__description">{html.escape(product["description"])}</div>'
+        f"</div></body></html>"
+    )
+
+
+class FixtureShop:
+    """The pages a FixtureShopHandler serves: collections that each list a slice of the products."""
+
+    def __init__(self, collections=10, products=500, seed=0):
+        self.products = {urlparse(p["url"]).path: p for p in generate_products(products, seed)}
+        self.created = int(time.time()) - 86400
+        self.modified = {}  # path -> time the page last changed, for Last-Modified
+        paths = list(self.products)
+        rng = random.Random(seed)
+        self.collections = {}
+        for i in range(collections):
+            # Every product sits in one collection, and a few show up in a second one too
+            members = paths[i::collections] + rng.sample(paths, min(len(paths), 5))
+            self.collections[f"collection-{i}"] = [self.products[path] for path in members]
+
+    def page(self, path):
+        """Return the HTML for a path, or None for a 404."""
+        path = path.rstrip("/") or "/"
+        if path == "/":
+            return render_home(self.collections)
+        if path.startswith("/collections/"):
+            members = self.collections.get(path[len("/collections/"):])
+            return None if members is None else render_collection(members)
+        product = self.products.get(path)
+        return None if product is None else render_product(product)
+
+    def last_modified(self, path):
+        return self.modified.get(path.rstrip("/") or "/", self.created)
+
+    def update_product(self, path, **fields):
+        """Change a product's fields in place, as a shop edit between crawls would."""
+        self.products[path].update(fields)
+        self.modified[path] = int(time.time())
+
+    def remove_product(self, path):
+        """Take a product down: its page 404s and no collection lists it any more."""
+        product = self.products.pop(path)
+        for slug, members in self.collections.items():
+            if product in members:
+                self.collections[slug] = [p for p in members if p is not product]
+                self.modified[f"/collections/{slug}"] = int(time.time())
+
+
+class FixtureShopHandler(BaseHTTPRequestHandler):
+    """Serves a FixtureShop over keep-alive HTTP/1.1, optionally slow, gzipped or rate limited."""
+
+    protocol_version = "HTTP/1.1"
+    shop = None
+    latency = 0.0       # seconds added to every response
+    fail_rate = 0.0     # share of requests answered 429 with Retry-After
+    validators = True   # send ETag/Last-Modified and answer conditional GETs with 304
+    connections = 0     # TCP connections accepted, to show keep-alive reuse
+    requests = 0
+    not_modified = 0    # 304s sent
+    counter_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.counter_lock:
+            type(self).connections += 1
+
+    def do_GET(self):
+        with self.counter_lock:
+            type(self).requests += 1
+        time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            self.send_body(429, b"Too Many Requests", {"Retry-After": "0"})
+            return
+        path = urlparse(self.path).path
+        page = self.shop.page(path)
+        if page is None:
+            self.send_body(404, b"Not Found")
+            return
+        body = page.encode("utf-8")
+        if not self.validators:
+            self.send_body(200, body)
+            return
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        modified = self.shop.last_modified(path)
+        headers = {"ETag": etag, "Last-Modified": formatdate(modified, usegmt=True)}
+        if self.is_not_modified(etag, modified):
+            with self.counter_lock:
+                type(self).not_modified += 1
+            self.send_body(304, b"", headers)
+            return
+        self.send_body(200, body, headers)
+
+    def is_not_modified(self, etag, modified):
+        if "If-None-Match" in self.headers:
+            return etag in self.headers["If-None-Match"]
+        since = self.headers.get("If-Modified-Since")
+        if since:
+            try:
+                return modified <= parsedate_to_datetime(since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def send_body(self, status, body, headers=None):
+        headers = dict(headers or {})
+        if status == 200 and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class FixtureShopServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Crawlers that are killed or time out drop their connections; that is expected here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_fixture_shop(shop, host="127.0.0.1", port=0, **settings):
+    """Serve a FixtureShop on a background thread; returns (server, base_url)."""
+    handler = type("ConfiguredFixtureShopHandler", (FixtureShopHandler,), {"shop": shop, **settings})
+    server = FixtureShopServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--collections", type=int, default=10)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    shop = FixtureShop(args.collections, args.products)
+    server, base_url = start_fixture_shop(shop, args.host, args.port, latency=args.latency, fail_rate=args.fail_rate)
+    print(f"Fixture shop on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Regression corpus for the intent router: (normalized message, intent, reads as a search)."""
+
+CORPUS = [
+    ("reset my cart", "cart_clear", True),
+    ("clear cart", "cart_clear", False),
+    ("empty my cart", "cart_clear", True),
+    ("please clear my cart", "search", True),
+    ("cart", "cart_view", False),
+    ("what's in my cart", "cart_view", True),
+    ("show my cart", "cart_view", True),
+    ("view cart", "cart_view", False),
+    ("add it", "cart_add", False),
+    ("add this product to the cart", "cart_add", True),
+    ("please add to my cart", "cart_add", True),
+    ("put it in my bag", "cart_add", True),
+    ("next", "next_page", False),
+    ("next one", "fallback", False),
+    ("what sizes are available", "ask_sizes", True),
+    ("is this size available in xl", "ask_sizes", True),
+    ("how much is it", "ask_price", True),
+    ("what's the price", "ask_price", True),
+    ("price of the blue one", "ask_price", True),
+    ("what colors do they have", "ask_colors", True),
+    ("available colors", "ask_colors", True),
+    ("tell me about it", "ask_description", True),
+    ("can you describe it", "ask_description", True),
+    ("where can i buy it", "ask_link", True),
+    ("product url", "ask_link", True),
+    ("can i see the link", "ask_link", True),
+    ("give me the link", "ask_link", True),
+    ("price", "product_field", True),
+    ("sizes", "product_field", True),
+    ("description", "product_field", False),
+    ("url please", "product_field", False),
+    ("the name", "product_field", False),
+    ("red cotton hoodie", "search", True),
+    ("do you have linen bed sheets", "search", True),
+    ("hoodie color", "search", True),
+    ("order status", "search", True),
+    ("hoodies", "fallback", False),
+    ("hello", "fallback", False),
+    ("thanks a lot", "search", True),
+]
@@ -0,0 +1,164 @@
+"""A local OpenAI-compatible chat completions server for offline testing.
+
+Start it, then point the app's client at it:
+    python -m app.benchmarks.stub_openai --port 8001 --token-delay 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python -m app.run
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/chat/completions, streamed or whole, with a canned reply.
+
+    Failures can be injected to exercise client retries: the first `fail_first`
+    requests, then a `fail_rate` share of the rest, get a `fail_status` error.
+    """
+
+    protocol_version = "HTTP/1.1"
+    first_token_delay = 0.2  # seconds before the first token, like model prefill
+    token_delay = 0.02       # seconds between streamed tokens
+    fail_first = 0
+    fail_rate = 0.0
+    fail_status = 503
+    answer_words = 0         # pad answers to this many words, like a verbose model; max_tokens still cuts them
+    bodies = None            # set to a list to keep every request body
+    requests = 0             # completions requested so far, failed ones included
+    counter_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply_text(self, body):
+        question = next((m["content"] for m in reversed(body.get("messages", [])) if m.get("role") == "user"), "")
+        words = f"This is a stub answer to: {question}. Our team will be happy to help with anything else.".split(" ")
+        words += ["More"] * (self.answer_words - len(words))
+        # One word stands in for one token
+        return " ".join(words[:body.get("max_tokens") or len(words)])
+
+    def do_POST(self):
+        try:
+            self.handle_completion()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up, e.g. on its own timeout
+
+    def handle_completion(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self.counter_lock:
+            type(self).requests += 1
+            number = type(self).requests
+            if self.bodies is not None:
+                self.bodies.append(body)
+        if number <= self.fail_first or random.random() < self.fail_rate:
+            self.send_json(self.fail_status, {"error": {"message": "Injected failure", "type": "stub_error"}},
+                           {"Retry-After": "0.1"} if self.fail_status == 429 else {})
+            return
+        text = self.reply_text(body)
+        model = body.get("model", "stub")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        time.sleep(self.first_token_delay)
+
+        if not body.get("stream"):
+            prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+            time.sleep(self.token_delay * len(text.split()))
+            self.send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text.split()),
+                          "total_tokens": prompt_tokens + len(text.split())},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word if i == 0 else " " + word}
+            if i == 0:
+                delta["role"] = "assistant"
+            self.send_chunk(completion_id, model, delta, None)
+            time.sleep(self.token_delay)
+        self.send_chunk(completion_id, model, {}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def send_chunk(self, completion_id, model, delta, finish_reason):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_stub_server(host="127.0.0.1", port=0, **settings):
+    """Build a stub server; settings override StubOpenAIHandler attributes such as token_delay."""
+    handler = type("ConfiguredStubOpenAIHandler", (StubOpenAIHandler,), settings)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stub_server(host="127.0.0.1", port=0, **settings):
+    """Run a stub server on a background thread; returns (server, base_url for the OpenAI client)."""
+    server = make_stub_server(host, port, **settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-token-delay", type=float, default=StubOpenAIHandler.first_token_delay)
+    parser.add_argument("--token-delay", type=float, default=StubOpenAIHandler.token_delay)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-status", type=int, default=503)
+    args = parser.parse_args()
+
+    server = make_stub_server(
+        args.host, args.port, first_token_delay=args.first_token_delay, token_delay=args.token_delay,
+        fail_rate=args.fail_rate, fail_status=args.fail_status,
+    )
+    print(f"Stub OpenAI server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
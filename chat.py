@@ -1,29 +1,168 @@
 from openai import OpenAI
+from app.llm_dispatch import LLMDispatcher
+from app.metrics import LLM_CACHE, span
+from app.response_cache import ResponseCache, normalize
+import hashlib
+import json
 
-# Set OpenAI API key
-client = OpenAI(api_key="aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa")  # Replace with your actual API key
+# Set OpenAI API key; retries are left to the dispatcher below
+client = OpenAI(api_key="aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa", max_retries=0)  # Replace with your actual API key
 GPT_MODEL = "gpt-4-1106-preview"  
+SYSTEM_PROMPT = (
+    "You are a helpful e-commerce chatbot that can answer questions about products and gives a genaric description "
+    "when asked on any product. Answer in at most three short sentences. When catalog lines are given, answer from "
+    "them and never invent prices, colors, sizes or stock."
+)
+# Estimated tokens the prompt may use, and the most the answer may use
+PROMPT_TOKEN_BUDGET = 600
+MAX_COMPLETION_TOKENS = 200
+# Rough size of a token in English text, and what each chat message costs on top of its text
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+# Longest description, and longest history message, put in a prompt, in characters
+PROMPT_FIELD_CHARS = 120
+HISTORY_MESSAGE_CHARS = 200
 
-def is_product_query(user_input):
-    """Check if the input is likely a product query."""
-    keywords = ["price", "color", "product", "size", "availability", "buy", "order"]
-    return any(keyword in user_input.lower() for keyword in keywords) or len(user_input.split()) > 2
+# Answers to repeated questions are served from here; pass db_file to keep them
+# across restarts and near_duplicates=True to reuse them for rephrasings
+response_cache = ResponseCache()
+# Bounds concurrent completions, coalesces identical in-flight questions and
+# retries 429/5xx with jittered backoff inside a per-call deadline
+dispatcher = LLMDispatcher()
+FALLBACK_RESPONSE = "Sorry, I'm having trouble understanding you right now."
 
+def estimate_tokens(text):
+    """Approximate token count of a prompt message; no tokenizer needed."""
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
 
-def get_ai_response(user_input):
-    """Get a response from OpenAI GPT."""
-    try:
-        messages = [
-            {"role": "system", "content": "You are a helpful e-commerce chatbot that can answer questions about products and gives a genaric description when asked on any product."},
-            {"role": "user", "content": user_input}
-        ]
-        response = client.chat.completions.create(
+
+def clip(text, limit):
+    """Collapse whitespace and cut text to at most `limit` characters."""
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def product_line(product):
+    """A Product as one compact line of catalog facts."""
+    return (f"{product.name} | {product.price} | colors: {product.colors} | sizes: {product.sizes} | "
+            f"{product.stock_status} | {clip(product.description, PROMPT_FIELD_CHARS)}")
+
+
+def build_messages(user_input, products=(), selected_product=None, history=()):
+    """Build the chat completion messages for a user question, within PROMPT_TOKEN_BUDGET.
+
+    The system prompt and the question always go in. Then, while they fit,
+    the selected product, the matching `products` best first, and the
+    (role, text) `history` newest first.
+    """
+    question = clip(user_input, HISTORY_MESSAGE_CHARS)
+    budget = PROMPT_TOKEN_BUDGET - estimate_tokens(SYSTEM_PROMPT) - estimate_tokens(question)
+    catalog = []
+    candidates = [("Selected product: ", selected_product)] if selected_product else []
+    candidates += [("- ", product) for product in products
+                   if not selected_product or product.id != selected_product.id]
+    for prefix, product in candidates:
+        line = prefix + product_line(product)
+        cost = len(line) // CHARS_PER_TOKEN + 1
+        if cost > budget:
+            break
+        catalog.append(line)
+        budget -= cost
+    system = SYSTEM_PROMPT
+    if catalog:
+        system += "\nCatalog:\n" + "\n".join(catalog)
+
+    earlier = []
+    for role, text in reversed(history):
+        message = {"role": role, "content": clip(text, HISTORY_MESSAGE_CHARS)}
+        cost = estimate_tokens(message["content"])
+        if cost > budget:
+            break
+        earlier.append(message)
+        budget -= cost
+    earlier.reverse()
+    return [{"role": "system", "content": system}, *earlier, {"role": "user", "content": question}]
+
+
+def context_key(messages):
+    """What besides the question an answer depends on: the system prompt with its catalog lines, and any history.
+
+    The history goes in as a digest, so the key stays short. An answer shaped
+    by one conversation is then never served to another; questions that open
+    a conversation still share their answers and calls.
+    """
+    system, earlier = messages[0]["content"], messages[1:-1]
+    if not earlier:
+        return system
+    digest = hashlib.sha256(json.dumps(earlier).encode("utf-8")).hexdigest()
+    return f"{system}\nConversation: {digest}"
+
+
+def get_ai_response(user_input, products=(), selected_product=None, history=()):
+    """Get a response from OpenAI GPT, or from the cache for a question already answered about the same products.
+
+    `products` and `selected_product` are catalog rows to ground the answer
+    in, and `history` the recent (role, text) messages of the conversation.
+    """
+    messages = build_messages(user_input, products, selected_product, history)
+    context = context_key(messages)
+    with span("llm_cache"):
+        cached = response_cache.get(user_input, GPT_MODEL, context)
+    LLM_CACHE.inc("miss" if cached is None else "hit")
+    if cached is not None:
+        return cached
+
+    def complete(timeout):
+        response = client.with_options(timeout=timeout).chat.completions.create(
             model=GPT_MODEL,
             messages=messages,
-            temperature=1
+            temperature=1,
+            max_tokens=MAX_COMPLETION_TOKENS
         )
-        return response.choices[0].message.content
-    except Exception as e:
-        print(f"OpenAI API error: {e}")
-        return "Sorry, I'm having trouble understanding you right now."
+        answer = response.choices[0].message.content
+        response_cache.put(user_input, GPT_MODEL, context, answer)
+        return answer
+
+    with span("llm"):
+        return dispatcher.call((GPT_MODEL, context, normalize(user_input)), complete, FALLBACK_RESPONSE)
+
 
+def stream_ai_response(user_input, products=(), selected_product=None, history=()):
+    """Yield a response from OpenAI GPT piece by piece as it is generated.
+
+    Goes through the dispatcher like get_ai_response, so streams share its
+    in-flight bound, deadline, retries and fallback.
+    """
+    messages = build_messages(user_input, products, selected_product, history)
+    context = context_key(messages)
+    with span("llm_cache"):
+        cached = response_cache.get(user_input, GPT_MODEL, context)
+    LLM_CACHE.inc("miss" if cached is None else "hit")
+    if cached is not None:
+        yield cached
+        return
+
+    def open_stream(timeout):
+        stream = client.with_options(timeout=timeout).chat.completions.create(
+            model=GPT_MODEL,
+            messages=messages,
+            temperature=1,
+            max_tokens=MAX_COMPLETION_TOKENS,
+            stream=True
+        )
+        return stream_pieces(stream, user_input, context)
+
+    yield from dispatcher.stream((GPT_MODEL, context, normalize(user_input)), open_stream, FALLBACK_RESPONSE)
+
+
+def stream_pieces(stream, user_input, context):
+    """Yield the text of a completion stream, and cache the answer once it is complete."""
+    pieces = []
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                pieces.append(chunk.choices[0].delta.content)
+                yield pieces[-1]
+    finally:
+        stream.close()
+    response_cache.put(user_input, GPT_MODEL, context, "".join(pieces))
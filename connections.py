@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import threading
+import weakref
+from pathlib import Path
+
+# How long any connection waits on a lock before giving up
+BUSY_TIMEOUT_MS = 5000
+# Read connections map the file into memory and keep a large page cache
+READ_PRAGMAS = {
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative means KiB, so 64 MiB
+    "temp_store": "MEMORY",
+    "query_only": 1,
+}
+WRITE_PRAGMAS = {
+    "journal_mode": "WAL",     # readers keep reading while the scraper or ingest writes
+    "synchronous": "NORMAL",
+}
+CACHED_STATEMENTS = 256
+
+_local = threading.local()
+_readers = weakref.WeakSet()  # open read connections, so they can all be closed at once
+_readers_lock = threading.Lock()
+_generation = 0               # bumped by close_read_connections to retire thread-local caches
+
+
+class ReadConnection(sqlite3.Connection):
+    """A plain connection that can be weakly referenced."""
+
+
+def _apply(conn, pragmas):
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def read_connection(db_file):
+    """Return this thread's persistent read-only connection to `db_file`.
+
+    Connections live for the life of the thread, so repeated queries reuse
+    their prepared statements instead of paying connect and parse costs.
+    A forked worker never reuses its parent's connections.
+    """
+    path = os.path.abspath(db_file)
+    owner = (os.getpid(), _generation)
+    if getattr(_local, "owner", None) != owner:
+        _local.connections = {}
+        _local.owner = owner
+    conn = _local.connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(
+            Path(path).as_uri() + "?mode=ro", uri=True, factory=ReadConnection,
+            cached_statements=CACHED_STATEMENTS, check_same_thread=False,
+        )
+        _apply(conn, READ_PRAGMAS)
+        _local.connections[path] = conn
+        with _readers_lock:
+            _readers.add(conn)
+    return conn
+
+
+def write_connection(db_file):
+    """Open a new writer connection with WAL journaling; the caller closes it."""
+    conn = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=CACHED_STATEMENTS)
+    _apply(conn, WRITE_PRAGMAS)
+    return conn
+
+
+def close_read_connections():
+    """Close every open read connection, e.g. before forking workers or on shutdown.
+
+    Threads open fresh connections on their next read.
+    """
+    global _generation
+    with _readers_lock:
+        _generation += 1
+        for conn in list(_readers):
+            conn.close()
+        _readers.clear()
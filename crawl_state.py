@@ -0,0 +1,118 @@
+import hashlib
+import threading
+import time
+
+from app.connections import write_connection
+
+# Product fields that decide whether a page changed, in a fixed order for hashing
+PRODUCT_FIELDS = ["name", "price", "description", "colors", "sizes", "stock_status", "url"]
+
+
+def body_hash(content):
+    """Hash of a raw page body, so a byte-identical page is not parsed again."""
+    return hashlib.sha1(content).hexdigest()
+
+
+def product_hash(product):
+    """Hash of the extracted product fields, which ignores theme or markup churn around them."""
+    return hashlib.sha1("\x1f".join(str(product.get(field, "")) for field in PRODUCT_FIELDS).encode("utf-8")).hexdigest()
+
+
+class CrawlState:
+    """Per-URL validators and hashes remembered between crawls of a shop.
+
+    The whole table is loaded when the state is opened and written back in one
+    transaction by save(), so scraper threads only touch an in-memory dict.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        conn = write_connection(db_file)
+        try:
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS crawl_state (
+                        url TEXT PRIMARY KEY,
+                        etag TEXT,
+                        last_modified TEXT,
+                        body_hash TEXT,
+                        product_hash TEXT,
+                        crawled_at REAL
+                    )
+                """)
+            rows = conn.execute(
+                "SELECT url, etag, last_modified, body_hash, product_hash, crawled_at FROM crawl_state"
+            ).fetchall()
+        finally:
+            conn.close()
+        self.entries = {row[0]: dict(zip(("etag", "last_modified", "body_hash", "product_hash", "crawled_at"), row[1:]))
+                        for row in rows}
+        self._dirty = set()
+        self._removed = set()
+
+    def get(self, url):
+        with self._lock:
+            return self.entries.get(url)
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since headers for a URL seen on an earlier crawl."""
+        entry = self.get(url)
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record(self, url, etag=None, last_modified=None, body_hash=None, product_hash=None):
+        with self._lock:
+            self.entries[url] = {
+                "etag": etag, "last_modified": last_modified, "body_hash": body_hash,
+                "product_hash": product_hash, "crawled_at": time.time(),
+            }
+            self._dirty.add(url)
+            self._removed.discard(url)
+
+    def touch(self, url):
+        """Mark a URL as still present without changing what is known about it."""
+        with self._lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                entry["crawled_at"] = time.time()
+                self._dirty.add(url)
+
+    def forget(self, urls):
+        with self._lock:
+            for url in urls:
+                if self.entries.pop(url, None) is not None:
+                    self._removed.add(url)
+                self._dirty.discard(url)
+
+    def missing(self, seen_urls):
+        """URLs known from earlier crawls that are not in `seen_urls`."""
+        with self._lock:
+            return [url for url in self.entries if url not in seen_urls]
+
+    def save(self):
+        """Write the changes since the state was opened or last saved."""
+        with self._lock:
+            updates = [(url, e["etag"], e["last_modified"], e["body_hash"], e["product_hash"], e["crawled_at"])
+                       for url, e in ((url, self.entries[url]) for url in self._dirty)]
+            removed = [(url,) for url in self._removed]
+            self._dirty.clear()
+            self._removed.clear()
+        conn = write_connection(self.db_file)
+        try:
+            with conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO crawl_state (url, etag, last_modified, body_hash, product_hash, crawled_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, updates)
+                conn.executemany("DELETE FROM crawl_state WHERE url = ?", removed)
+        finally:
+            conn.close()
+
+    def __len__(self):
+        return len(self.entries)
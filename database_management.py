@@ -1,9 +1,110 @@
 import sqlite3
 import csv
+import json
+import os
+import re
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+
+from app.connections import read_connection, write_connection
+from app.metrics import span
+
+PRODUCT_COLUMNS = ["id", "name", "price", "description", "colors", "sizes", "stock_status", "url", "price_minor", "currency"]
+PRODUCT_SELECT = "p.id, p.name, p.price, p.description, p.colors, p.sizes, p.stock_status, p.url, p.price_minor, p.currency"
+# A product row; read its fields by name, never by position
+Product = namedtuple("Product", PRODUCT_COLUMNS)
+# How many bm25-ranked rows search_products hands back for fuzzy reranking
+FTS_CANDIDATES = 200
+# CSV rows written per executemany call during ingest
+INGEST_BATCH_SIZE = 5000
+# Most rows a facet query hands back for fuzzy ranking of its free text
+FACET_ROWS = 5000
+
+# Prices are stored as integer minor units (piastres, cents) next to an ISO currency code
+DEFAULT_CURRENCY = "EGP"
+PRICE_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+CURRENCY_MARKER = re.compile(r"egp|l\.e\.?|\ble\b|usd|\$|eur|€", re.IGNORECASE)
+CURRENCY_CODES = {"egp": "EGP", "l.e": "EGP", "l.e.": "EGP", "le": "EGP", "usd": "USD", "$": "USD", "eur": "EUR", "€": "EUR"}
+# Placeholder values the scraper and CSV ingest use for a missing colors or sizes field
+# What create_database builds, as sqlite_master (type, name) pairs; serve.py refuses a catalog missing any
+SCHEMA_OBJECTS = [
+    ("table", "products"),
+    ("index", "products_url"),
+    ("table", "product_color"),
+    ("table", "product_size"),
+    ("trigger", "products_facets_delete"),
+    ("table", "catalog_version"),
+]
+NO_FACET_VALUES = {"no available colors", "no available sizes", "no data available", "unknown"}
+
+# Re-ingesting a product (same url) updates it in place, and leaves unchanged rows untouched
+UPSERT_PRODUCT = """
+    INSERT INTO products (name, price, description, colors, sizes, stock_status, url, price_minor, currency)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET
+        name = excluded.name,
+        price = excluded.price,
+        description = excluded.description,
+        colors = excluded.colors,
+        sizes = excluded.sizes,
+        stock_status = excluded.stock_status,
+        price_minor = excluded.price_minor,
+        currency = excluded.currency
+    WHERE (name, price, description, colors, sizes, stock_status)
+        IS NOT (excluded.name, excluded.price, excluded.description,
+                excluded.colors, excluded.sizes, excluded.stock_status)
+"""
+# Ingest connections note the ids their upserts insert or change, so facet rows are
+# derived in SQL for just those products
+TRACK_WRITES = [
+    "CREATE TEMP TABLE IF NOT EXISTS written_products (id INTEGER)",
+    """CREATE TEMP TRIGGER IF NOT EXISTS products_written_insert AFTER INSERT ON main.products BEGIN
+           INSERT INTO written_products (id) VALUES (new.id);
+       END""",
+    """CREATE TEMP TRIGGER IF NOT EXISTS products_written_update AFTER UPDATE ON main.products BEGIN
+           INSERT INTO written_products (id) VALUES (new.id);
+       END""",
+]
+INSERT_FACETS = """
+    INSERT OR IGNORE INTO product_{facet} (product_id, {facet})
+    SELECT p.id, value FROM products p, json_each(facet_json(p.{field}))
+    WHERE p.id IN (SELECT id FROM written_products)
+"""
+
+def parse_price(text):
+    """Split a scraped price like "LE 1,234.50" into (123450, "EGP"), or (None, None) without a number."""
+    match = PRICE_NUMBER.search(text or "")
+    if match is None:
+        return None, None
+    marker = CURRENCY_MARKER.search(text)
+    currency = CURRENCY_CODES[marker.group().lower()] if marker else DEFAULT_CURRENCY
+    amount = Decimal(match.group().replace(",", ""))
+    return int((amount * 100).to_integral_value(ROUND_HALF_UP)), currency
+
+@lru_cache(maxsize=4096)
+def facet_values(text):
+    """Lowercased distinct values of a comma-joined colors or sizes field.
+
+    Cached, since catalogs repeat the same few color and size lists endlessly.
+    """
+    values = []
+    for value in (text or "").split(","):
+        value = " ".join(value.split()).lower()
+        if value and value not in values and value not in NO_FACET_VALUES:
+            values.append(value)
+    return tuple(values)
+
+@lru_cache(maxsize=4096)
+def facet_json(text):
+    """facet_values as a JSON array, for json_each in ingest SQL."""
+    return json.dumps(facet_values(text))
 
 def create_database(db_file):
     """Create a SQLite database and the products table."""
-    conn = sqlite3.connect(db_file)
+    conn = write_connection(db_file)
     cursor = conn.cursor()
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS products (
@@ -14,70 +115,380 @@ def create_database(db_file):
             colors TEXT,
             sizes TEXT,
             stock_status TEXT,
-            url TEXT
-            
+            url TEXT,
+            price_minor INTEGER,
+            currency TEXT
         );
     """)
+    _ensure_url_key(conn)
+    _ensure_facets(conn)
+    _ensure_catalog_version(conn)
     conn.commit()
     conn.close()
 
-def insert_products_from_csv(db_file, csv_file):
-    """Insert products from a CSV file into the database."""
-    conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
-    with open(csv_file, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
+def missing_schema(db_file):
+    """The SCHEMA_OBJECTS `db_file` lacks, as "type name" strings; all of them if the file does not exist.
+
+    Only reads the catalog. create_database adds what is missing, and may
+    delete duplicate rows doing so.
+    """
+    try:
+        present = set(read_connection(db_file).execute("SELECT type, name FROM sqlite_master"))
+    except sqlite3.OperationalError:
+        present = set()
+    return [f"{kind} {name}" for kind, name in SCHEMA_OBJECTS if (kind, name) not in present]
+
+def _ensure_url_key(conn):
+    """Add the UNIQUE url index, first dropping older duplicate rows left by earlier ingests."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'products_url'").fetchone()
+    if exists:
+        return
+    conn.execute("DELETE FROM products WHERE url IS NOT NULL AND id NOT IN (SELECT MAX(id) FROM products GROUP BY url)")
+    conn.execute("CREATE UNIQUE INDEX products_url ON products(url)")
+
+def _ensure_facets(conn):
+    """Add the typed price columns and the color/size facet tables, filling them from existing rows.
+
+    Triggers drop a product's facet rows when it is deleted or its colors or
+    sizes change; ingest then inserts the current ones.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'products_facets_delete'").fetchone()
+    if exists:
+        return
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+    if "price_minor" not in columns:
+        conn.execute("ALTER TABLE products ADD COLUMN price_minor INTEGER")
+        conn.execute("ALTER TABLE products ADD COLUMN currency TEXT")
+    for statement in (
+        "CREATE TABLE IF NOT EXISTS product_color (product_id INTEGER NOT NULL, color TEXT NOT NULL, PRIMARY KEY (color, product_id)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS product_size (product_id INTEGER NOT NULL, size TEXT NOT NULL, PRIMARY KEY (size, product_id)) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS product_color_product ON product_color(product_id)",
+        "CREATE INDEX IF NOT EXISTS product_size_product ON product_size(product_id)",
+        "CREATE INDEX IF NOT EXISTS products_price_minor ON products(price_minor)",
+        """CREATE TRIGGER IF NOT EXISTS products_colors_update AFTER UPDATE OF colors ON products
+           WHEN old.colors IS NOT new.colors BEGIN
+               DELETE FROM product_color WHERE product_id = old.id;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS products_sizes_update AFTER UPDATE OF sizes ON products
+           WHEN old.sizes IS NOT new.sizes BEGIN
+               DELETE FROM product_size WHERE product_id = old.id;
+           END""",
+        """CREATE TRIGGER products_facets_delete AFTER DELETE ON products BEGIN
+               DELETE FROM product_color WHERE product_id = old.id;
+               DELETE FROM product_size WHERE product_id = old.id;
+           END""",
+    ):
+        conn.execute(statement)
+    rows = conn.execute("SELECT id, price, colors, sizes FROM products").fetchall()
+    conn.executemany("UPDATE products SET price_minor = ?, currency = ? WHERE id = ?",
+                     (parse_price(price) + (product_id,) for product_id, price, _, _ in rows))
+    conn.executemany("INSERT OR IGNORE INTO product_color (product_id, color) VALUES (?, ?)",
+                     ((product_id, color) for product_id, _, colors, _ in rows for color in facet_values(colors)))
+    conn.executemany("INSERT OR IGNORE INTO product_size (product_id, size) VALUES (?, ?)",
+                     ((product_id, size) for product_id, _, _, sizes in rows for size in facet_values(sizes)))
+
+def _ensure_catalog_version(conn):
+    """Add the one-row table whose version every write that changes products bumps."""
+    conn.execute("CREATE TABLE IF NOT EXISTS catalog_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)")
+
+def _bump_catalog_version(conn, changes_before):
+    """Bump the catalog version if the connection changed any rows since `changes_before`."""
+    if conn.total_changes != changes_before:
+        _ensure_catalog_version(conn)
+        conn.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+
+def fetch_catalog_version(database_path):
+    """The catalog's version number, or None for a database without the version table."""
+    try:
+        row = read_connection(database_path).execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+def _prepare_ingest(conn):
+    """Bring the schema up to date and set up write tracking on an ingest connection."""
+    _ensure_url_key(conn)
+    _ensure_facets(conn)
+    for statement in TRACK_WRITES:
+        conn.execute(statement)
+    conn.create_function("facet_json", 1, facet_json, deterministic=True)
+
+def _write_products(conn, rows):
+    """Upsert product value tuples in CSV_FIELDS order, with their typed price and facet rows.
+
+    The products go in with one executemany. The facet rows then come from
+    a single INSERT ... SELECT per facet over the products the batch inserted
+    or changed, so re-ingesting an unchanged catalog stays cheap. A changed
+    product's old facet rows were already dropped by the update triggers if
+    its colors or sizes changed.
+    """
+    conn.execute("DELETE FROM written_products")
+    conn.executemany(UPSERT_PRODUCT, (row + parse_price(row[1]) for row in rows))
+    conn.execute(INSERT_FACETS.format(facet="color", field="colors"))
+    conn.execute(INSERT_FACETS.format(facet="size", field="sizes"))
+
+# CSV columns in UPSERT_PRODUCT order, with the value used when the export lacks the column
+CSV_FIELDS = [
+    ('name', 'Unknown'),
+    ('price', 'Unknown'),
+    ('description', 'Unknown'),
+    ('colors', 'no available colors'),
+    ('sizes', 'no available sizes'),
+    ('stock_status', 'out of'),
+    ('url', None),  # a NULL url never conflicts, so url-less rows stay separate products
+]
+
+def _csv_rows(csvfile):
+    """Yield product value tuples from a CSV export, one row in memory at a time."""
+    reader = csv.reader(csvfile)
+    header = next(reader, None)
+    if header is None:
+        return
+    positions = [header.index(field) if field in header else None for field, _ in CSV_FIELDS]
+    defaults = [default for _, default in CSV_FIELDS]
+    if None not in positions:
+        pick = itemgetter(*positions)
+        width = len(header)
         for row in reader:
-            cursor.execute("""
-                INSERT OR IGNORE INTO products (name, price, description, colors, sizes, stock_status, url)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                row.get('name', 'Unknown'),
-                row.get('price', 'Unknown'),
-                row.get('description', 'Unknown'),
-                row.get('colors', 'no available colors'),
-                row.get('sizes', 'no available sizes'),
-                row.get('stock_status', 'out of'),
-                row.get('url', 'Unknown')
-                
-            ))
-    conn.commit()
-    conn.close()
+            if len(row) >= width:
+                yield pick(row)
+            elif row:
+                # Short rows read like csv.DictReader, with missing trailing values as None
+                yield tuple(row[i] if i < len(row) else None for i in positions)
+        return
+    for row in reader:
+        if row:
+            yield tuple(default if i is None else (row[i] if i < len(row) else None)
+                        for i, default in zip(positions, defaults))
+
+def insert_products_from_csv(db_file, csv_file, batch_size=INGEST_BATCH_SIZE, bulk=False):
+    """Upsert products from a CSV file into the database, keyed on url.
+
+    The file is streamed and written in batches inside a single transaction, so
+    memory stays flat however large the export is. bulk=True also skips fsync and
+    keeps the rollback journal in memory for the load; that is fastest for big
+    loads, but a crash mid-ingest can corrupt the file, so keep it for rebuilds.
+    Returns the number of CSV rows read.
+    """
+    conn = write_connection(db_file)
+    if bulk:
+        conn.execute("PRAGMA synchronous = OFF")
+        # Only takes effect when no reader has the database open
+        conn.execute("PRAGMA journal_mode = MEMORY")
+    count = 0
+    try:
+        with open(csv_file, newline='', encoding='utf-8') as csvfile:
+            rows = _csv_rows(csvfile)
+            with conn:
+                changes = conn.total_changes
+                _prepare_ingest(conn)
+                while True:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+                    _write_products(conn, batch)
+                    count += len(batch)
+                _bump_catalog_version(conn, changes)
+    finally:
+        if bulk:
+            conn.execute("PRAGMA journal_mode = WAL")
+        conn.close()
+    return count
+
+def upsert_products(db_file, products, batch_size=INGEST_BATCH_SIZE):
+    """Upsert scraped product dicts keyed on url, e.g. the changes from an incremental crawl."""
+    if not products:
+        return 0
+    rows = (tuple(product.get(field, default) for field, default in CSV_FIELDS) for product in products)
+    conn = write_connection(db_file)
+    count = 0
+    try:
+        with conn:
+            changes = conn.total_changes
+            _prepare_ingest(conn)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                _write_products(conn, batch)
+                count += len(batch)
+            _bump_catalog_version(conn, changes)
+    finally:
+        conn.close()
+    return count
+
+def delete_products_by_url(db_file, urls):
+    """Delete the products whose page has gone from the shop; returns the number of rows removed."""
+    if not urls:
+        return 0
+    conn = write_connection(db_file)
+    try:
+        with conn:
+            changes = conn.total_changes
+            removed = conn.executemany("DELETE FROM products WHERE url = ?", ((url,) for url in urls)).rowcount
+            _bump_catalog_version(conn, changes)
+            return removed
+    finally:
+        conn.close()
+
+def _product_row(cursor, row):
+    return Product._make(row)
+
+def _product_cursor(database_path):
+    """A read cursor returning Product rows, for queries selecting PRODUCT_SELECT."""
+    cursor = read_connection(database_path).cursor()
+    cursor.row_factory = _product_row
+    return cursor
 
 def fetch_products_by_name(database_path, product_name):
     """Fetch products from the database that match the given product name."""
-    conn = sqlite3.connect(database_path)
-    cursor = conn.cursor()
+    cursor = _product_cursor(database_path)
     try:
         # Prepare a SQL query to search for products by name
-        query = """
-        SELECT id, name, price, description, colors, sizes, stock_status, url
-        FROM products
+        query = f"""
+        SELECT {PRODUCT_SELECT}
+        FROM products p
         WHERE name LIKE ?
         """
         # Execute the query using wildcard for partial match
-        cursor.execute(query, ('%' + product_name + '%',))
-        results = cursor.fetchall()
+        with span("sqlite_read"):
+            cursor.execute(query, ('%' + product_name + '%',))
+            results = cursor.fetchall()
         return results
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return []  # Return an empty list in case of error
+
+def fetch_product_by_id(database_path, product_id):
+    """Fetch a single product row by its id, or None."""
+    try:
+        query = f"""
+        SELECT {PRODUCT_SELECT}
+        FROM products p
+        WHERE id = ?
+        """
+        with span("sqlite_read"):
+            return _product_cursor(database_path).execute(query, (product_id,)).fetchone()
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return None
+
+def create_search_index(db_file):
+    """Create the FTS5 trigram table mirroring products.name/description, kept in sync by triggers."""
+    conn = write_connection(db_file)
+    try:
+        conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                name, description,
+                content='products', content_rowid='id', tokenize='trigram'
+            );
+            CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts(rowid, name, description)
+                VALUES (new.id, new.name, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, name, description)
+                VALUES ('delete', old.id, old.name, old.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, description ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, name, description)
+                VALUES ('delete', old.id, old.name, old.description);
+                INSERT INTO products_fts(rowid, name, description)
+                VALUES (new.id, new.name, new.description);
+            END;
+            INSERT INTO products_fts(products_fts) VALUES ('rebuild');
+        """)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        # Older SQLite builds lack FTS5 or the trigram tokenizer
+        print(f"Could not create search index: {e}")
+        return False
     finally:
         conn.close()
 
+def _fts_query(text):
+    """Turn free text into an OR of its word trigrams, so typos still share most terms."""
+    grams = []
+    for word in text.lower().split():
+        for i in range(len(word) - 2):
+            gram = '"' + word[i:i + 3].replace('"', '""') + '"'
+            if gram not in grams:
+                grams.append(gram)
+    return " OR ".join(grams)
+
+def search_products(database_path, text, limit=FTS_CANDIDATES):
+    """Fetch the `limit` best bm25-ranked products for free text from the FTS5 table."""
+    match = _fts_query(text)
+    if not match:
+        return []
+    try:
+        # Name hits weigh twice as much as description hits
+        query = f"""
+        SELECT {PRODUCT_SELECT}
+        FROM products_fts
+        JOIN products p ON p.id = products_fts.rowid
+        WHERE products_fts MATCH ?
+        ORDER BY bm25(products_fts, 2.0, 1.0)
+        LIMIT ?
+        """
+        with span("sqlite_read"):
+            return _product_cursor(database_path).execute(query, (match, limit)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return []
+
+def search_by_facets(database_path, colors=(), sizes=(), min_price=None, max_price=None, limit=FACET_ROWS):
+    """Products having any of `colors`, any of `sizes` and a price in [min_price, max_price] minor units, cheapest first.
+
+    Facets come from the indexed product_color/product_size tables, so no
+    colors or sizes strings are scanned. Empty filters are ignored.
+    """
+    clauses, params = [], []
+    if colors:
+        clauses.append(f"p.id IN (SELECT product_id FROM product_color WHERE color IN ({', '.join('?' * len(colors))}))")
+        params.extend(colors)
+    if sizes:
+        clauses.append(f"p.id IN (SELECT product_id FROM product_size WHERE size IN ({', '.join('?' * len(sizes))}))")
+        params.extend(sizes)
+    if min_price is not None:
+        clauses.append("p.price_minor >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        clauses.append("p.price_minor <= ?")
+        params.append(max_price)
+    query = f"""
+    SELECT {PRODUCT_SELECT}
+    FROM products p
+    WHERE {" AND ".join(clauses) or "1"}
+    ORDER BY p.price_minor IS NULL, p.price_minor
+    LIMIT ?
+    """
+    with span("sqlite_read"):
+        return _product_cursor(database_path).execute(query, (*params, limit)).fetchall()
+
+def fetch_facet_values(database_path):
+    """Every distinct color and size in the catalog, as (colors, sizes)."""
+    conn = read_connection(database_path)
+    colors = [row[0] for row in conn.execute("SELECT DISTINCT color FROM product_color")]
+    sizes = [row[0] for row in conn.execute("SELECT DISTINCT size FROM product_size")]
+    return colors, sizes
+
 def fetch_all_products(db_file):
     """Fetch and display all products from the database."""
-    conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
+    cursor = read_connection(db_file).cursor()
     cursor.execute("SELECT * FROM products")
     rows = cursor.fetchall()
     for row in rows:
         print(row)
-    conn.close()
 
 if __name__ == "__main__":
-    db_file = "ecommerce_products.db"
-    csv_file = "scraper/products.csv" 
+    # Run from the directory containing the package: python -m app.database_management
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    db_file = os.path.join(base_dir, "ecommerce_products.db")
+    csv_file = os.path.join(base_dir, "scraper", "products.csv")
     create_database(db_file)
     insert_products_from_csv(db_file, csv_file)
+    create_search_index(db_file)
     fetch_all_products(db_file)
@@ -0,0 +1,105 @@
+import re
+from collections import namedtuple
+from decimal import Decimal
+
+from app.database_management import fetch_facet_values
+from app.search_index import CatalogCache
+
+FacetQuery = namedtuple("FacetQuery", ["colors", "sizes", "min_price", "max_price", "text"])
+
+AMOUNT = r"(?:le|egp|l\.e\.?|\$)?\s*(\d[\d,]*(?:\.\d+)?)\s*(?:le|egp|l\.e\.?|pounds?|\$)?"
+PRICE_RANGE = re.compile(rf"\bbetween\s+{AMOUNT}\s+and\s+{AMOUNT}")
+PRICE_BOUND = re.compile(rf"\b(under|below|less than|cheaper than|up to|at most|max|over|above|more than|at least|from|min)\s+{AMOUNT}")
+UPPER_BOUNDS = {"under", "below", "less than", "cheaper than", "up to", "at most", "max"}
+# A size is only read from a bare letter or number when one of these comes right before it
+SIZE_CUES = {"size", "sizes", "in", "sized"}
+SIZE_ALIASES = {"extra small": "xs", "small": "s", "medium": "m", "large": "l", "extra large": "xl"}
+# Words that frame the request rather than describe the product, dropped from the free text
+FILLER_WORDS = {
+    "show", "me", "i", "i'm", "im", "want", "need", "looking", "look", "for", "find", "a", "an", "the", "some", "any", "in",
+    "size", "sizes", "sized", "with", "and", "or", "please", "do", "you", "have", "get", "color", "colour",
+    "colors", "colours", "colored", "coloured", "le", "egp", "pound", "pounds", "that", "are", "is", "of", "items",
+    "products", "what", "which", "there", "available", "cost", "costs", "priced", "price",
+}
+
+
+def _minor(amount):
+    return int(Decimal(amount.replace(",", "")) * 100)
+
+
+class FacetParser:
+    """Reads color, size and price filters out of a message, using the catalog's own color and size values.
+
+    A color word matches every catalog color it is the last word of, so
+    "blue" also finds "navy blue". What is left after the filters and filler
+    words becomes free text to rank the filtered products by. Colors only
+    filter alongside a size or price: on their own they are as likely to be
+    part of a name ("Black Forest Scented Candle"), which name search finds.
+    """
+
+    def __init__(self, colors, sizes, version=None):
+        self.version = version
+        self.sizes = set(sizes)
+        self.colors = {}   # phrase in a message -> catalog color values it stands for
+        for color in colors:
+            self.colors.setdefault(color, set()).add(color)
+            self.colors.setdefault(color.split()[-1], set()).add(color)
+        # Longest phrases first so "navy blue" wins over "blue"
+        phrases = sorted(self.colors, key=len, reverse=True)
+        self.color_pattern = re.compile(r"\b(" + "|".join(map(re.escape, phrases)) + r")\b") if phrases else None
+        aliases = [alias for alias, size in SIZE_ALIASES.items() if size in self.sizes]
+        aliases.sort(key=len, reverse=True)
+        self.alias_pattern = re.compile(r"\b(" + "|".join(aliases) + r")\b") if aliases else None
+
+    def parse(self, message):
+        """Return a FacetQuery for a lowercased message, or None when it names no size or price."""
+        min_price = max_price = None
+        text = message
+        match = PRICE_RANGE.search(text)
+        if match:
+            low, high = sorted((_minor(match.group(1)), _minor(match.group(2))))
+            min_price, max_price = low, high
+            text = text[:match.start()] + " " + text[match.end():]
+        for match in list(PRICE_BOUND.finditer(text)):
+            if match.group(1) in UPPER_BOUNDS:
+                max_price = _minor(match.group(2))
+            else:
+                min_price = _minor(match.group(2))
+        text = PRICE_BOUND.sub(" ", text)
+
+        colors = set()
+        if self.color_pattern is not None:
+            for match in self.color_pattern.finditer(text):
+                colors |= self.colors[match.group(1)]
+            text = self.color_pattern.sub(" ", text)
+
+        sizes = set()
+        if self.alias_pattern is not None:
+            sizes |= {SIZE_ALIASES[match.group(1)] for match in self.alias_pattern.finditer(text)}
+            text = self.alias_pattern.sub(" ", text)
+        words = []
+        previous = None
+        for word in re.findall(r"[\w'-]+", text):
+            # Bare "m", "s" or "32" are only sizes right after "size" or "in"; "xl" and "xxl" always are
+            if word in self.sizes and (previous in SIZE_CUES or (len(word) > 1 and not word.isdigit())):
+                sizes.add(word)
+            elif word not in FILLER_WORDS:
+                words.append(word)
+            previous = word
+
+        if not sizes and min_price is None and max_price is None:
+            return None
+        return FacetQuery(sorted(colors), sorted(sizes), min_price, max_price, " ".join(words))
+
+
+def build_facet_parser(database_path, version=None):
+    colors, sizes = fetch_facet_values(database_path)
+    return FacetParser(colors, sizes, version)
+
+
+_parsers = CatalogCache(build_facet_parser)
+
+
+def get_facet_parser(database_path):
+    """Return the facet parser for a database, rebuilt in the background when its catalog changes."""
+    return _parsers.get(database_path)
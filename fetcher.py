@@ -0,0 +1,106 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import brotli  # noqa: F401  lets urllib3 decode "br" responses
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+MAX_CONNECTIONS = 32       # requests in flight across all hosts
+MAX_PER_HOST = 8           # requests in flight to any one host
+TIMEOUT = (5, 20)          # connect, read seconds
+MAX_ATTEMPTS = 4
+BACKOFF = 0.5              # base seconds for the jittered exponential backoff
+MAX_BACKOFF = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+USER_AGENT = "Mozilla/5.0 (compatible; DomzCatalogBot/1.0)"
+
+
+class Fetcher:
+    """Shared HTTP GET layer for the scraper.
+
+    One keep-alive session is pooled across threads. Concurrency is capped
+    globally and per host, every request has a timeout, and 429/5xx answers
+    and connection errors are retried with jittered backoff that honours
+    Retry-After. `per_host_interval` spaces out request starts to a host.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_per_host=MAX_PER_HOST, timeout=TIMEOUT,
+                 max_attempts=MAX_ATTEMPTS, backoff=BACKOFF, per_host_interval=0.0, compression=True):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.per_host_interval = per_host_interval
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max_per_host, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": USER_AGENT,
+            "Accept-Encoding": ACCEPT_ENCODING if compression else "identity",
+        })
+        self.requests = 0
+        self.retries = 0
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._hosts = {}     # host -> (semaphore, [next allowed start time])
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _host_slot(self, host):
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None:
+                entry = self._hosts[host] = (threading.BoundedSemaphore(self.max_per_host), [0.0])
+        semaphore, next_start = entry
+        with semaphore:
+            if self.per_host_interval:
+                with self._lock:
+                    start = max(time.monotonic(), next_start[0])
+                    next_start[0] = start + self.per_host_interval
+                time.sleep(max(0.0, start - time.monotonic()))
+            yield
+
+    def get(self, url, **kwargs):
+        """GET a URL, returning the last response (which may be an error status) or raising on network failure."""
+        host = urlparse(url).netloc
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(1, self.max_attempts + 1):
+            response, error = None, None
+            with self._slots, self._host_slot(host):
+                try:
+                    response = self.session.get(url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+                with self._lock:
+                    self.requests += 1
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt == self.max_attempts:
+                if response is not None:
+                    return response
+                raise error
+            with self._lock:
+                self.retries += 1
+            time.sleep(self._delay(attempt, response))
+
+    def _delay(self, attempt, response):
+        delay = random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** (attempt - 1)))
+        if response is not None:
+            try:
+                delay = max(delay, min(MAX_BACKOFF, float(response.headers.get("Retry-After", 0))))
+            except ValueError:
+                pass  # an HTTP date; the backoff will have to do
+            response.close()
+        return delay
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,110 @@
+import re
+from collections import namedtuple
+
+EXACT = "exact"        # the whole message must be the phrase
+CONTAINS = "contains"  # the phrase may appear anywhere in the message
+
+# Intent table, highest priority first: (intent, product field, mode, phrases)
+INTENTS = [
+    ("cart_clear", None, EXACT, [
+        "reset my cart", "clear my cart", "empty my cart", "reset cart", "clear cart", "empty cart",
+    ]),
+    ("cart_view", None, EXACT, [
+        "what is in my cart", "show my cart", "what's in my cart", "show cart", "view my cart", "view cart", "cart",
+    ]),
+    ("cart_add", None, CONTAINS, [
+        "add this product", "add it to the cart", "add it", "put it", "add to cart", "add to my cart",
+    ]),
+    ("next_page", None, EXACT, ["next"]),
+    ("ask_sizes", "sizes", CONTAINS, [
+        "do they have sizes", "what sizes are available", "available sizes", "sizes available",
+        "what sizes do they have", "do they have this size", "is this size available", "what are the sizes",
+    ]),
+    ("ask_price", "price", CONTAINS, [
+        "what is the price", "how much is it", "what's the price", "price of", "how much does it cost",
+    ]),
+    ("ask_colors", "colors", CONTAINS, [
+        "do they have colors", "what colors are available", "available colors", "colors available",
+        "what colors do they have", "is this color available", "what are the colors",
+    ]),
+    ("ask_description", "description", CONTAINS, [
+        "what is the description", "tell me about it", "describe this product", "what does it do",
+        "can you describe it", "details about the product",
+    ]),
+    ("ask_link", "url", CONTAINS, [
+        "where can I buy it", "give me the link", "product URL", "show me the website",
+        "where is it listed", "can I see the link",
+    ]),
+    # A bare column name asks for that field of the selected product
+    ("product_field", "name", CONTAINS, ["name"]),
+    ("product_field", "price", CONTAINS, ["price"]),
+    ("product_field", "description", CONTAINS, ["description"]),
+    ("product_field", "colors", CONTAINS, ["colors"]),
+    ("product_field", "sizes", CONTAINS, ["sizes"]),
+    ("product_field", "stock_status", CONTAINS, ["stock_status"]),
+    ("product_field", "url", CONTAINS, ["url"]),
+    ("search", None, CONTAINS, ["price", "color", "product", "size", "availability", "buy", "order"]),
+]
+
+# Messages longer than this many words are treated as product searches
+SEARCH_MIN_WORDS = 3
+
+Route = namedtuple("Route", ["intent", "field", "search"])
+SEARCH_ROUTE = Route("search", None, True)
+FALLBACK_ROUTE = Route("fallback", None, False)
+
+
+def _alternation(phrases):
+    """A regex matching any of the literal phrases, trying them in the given order."""
+    return "|".join(re.escape(phrase) for phrase in phrases) or "(?!)"
+
+
+class IntentRouter:
+    """Classify a normalized, lowercased message against an intent table.
+
+    A message equal to an EXACT phrase is one dict lookup. The CONTAINS
+    phrases are compiled, highest priority first, into one regex alternation,
+    so the scan runs in the re engine rather than in Python; resuming the
+    search one character after each match's start finds the best phrase
+    starting at every offset, even where phrases overlap. The search
+    keywords get their own pattern, since they count wherever they appear,
+    whatever else matches there. Routes are built once, not per message.
+    """
+
+    def __init__(self, intents=INTENTS):
+        # mode -> {phrase: (priority, route when not a search, route when a search)}
+        self.rules = {EXACT: {}, CONTAINS: {}}
+        keywords = []
+        for priority, (intent, field, mode, intent_phrases) in enumerate(intents):
+            for phrase in intent_phrases:
+                # Messages are matched lowercased, so the table is compiled the same way
+                phrase = " ".join(phrase.lower().split())
+                if intent == "search":
+                    keywords.append(phrase)
+                else:
+                    self.rules[mode].setdefault(phrase, (priority, Route(intent, field, False), Route(intent, field, True)))
+        self.contains = re.compile(_alternation(self.rules[CONTAINS]))
+        self.keywords = re.compile(_alternation(keywords))
+
+    def classify(self, message):
+        """Return the Route for a message: its best intent, the product field it asks about, and
+        whether it also reads as a product search."""
+        best = self.rules[EXACT].get(message)
+        match = self.contains.search(message)
+        while match is not None:
+            rule = self.rules[CONTAINS][match.group()]
+            if best is None or rule[0] < best[0]:
+                best = rule
+            match = self.contains.search(message, match.start() + 1)
+        search = len(message.split()) >= SEARCH_MIN_WORDS or self.keywords.search(message) is not None
+        if best is not None:
+            return best[2] if search else best[1]
+        return SEARCH_ROUTE if search else FALLBACK_ROUTE
+
+
+router = IntentRouter()
+
+
+def classify(message):
+    """Classify a message with the default intent table."""
+    return router.classify(message)
@@ -0,0 +1,235 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+DEFAULT_MAX_IN_FLIGHT = 8    # upstream calls running at once
+DEFAULT_MAX_WAITING = 32     # calls queued behind them before new ones are turned away
+DEFAULT_DEADLINE = 20.0      # seconds a caller waits for an answer, retries included
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BACKOFF = 0.5        # base seconds for the jittered exponential backoff
+DEFAULT_MAX_BACKOFF = 4.0
+
+
+def is_retryable(error):
+    """Rate limits and server errors are worth another attempt; anything else is not."""
+    status = getattr(error, "status_code", None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def retry_after(error):
+    """Seconds the upstream asked us to wait, if it sent a Retry-After header."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class StreamFlight:
+    """The pieces of one streamed answer as they arrive, followed by every caller sharing it."""
+
+    def __init__(self):
+        self.pieces = []
+        self.done = False
+        self.error = None
+        self._condition = threading.Condition()
+
+    def add(self, piece):
+        with self._condition:
+            self.pieces.append(piece)
+            self._condition.notify_all()
+
+    def finish(self, error=None):
+        with self._condition:
+            self.done = True
+            self.error = error
+            self._condition.notify_all()
+
+    def follow(self, deadline):
+        """Yield every piece from the first; raises the stream's error, or TimeoutError at the deadline."""
+        sent = 0
+        while True:
+            with self._condition:
+                while sent == len(self.pieces) and not self.done:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("deadline passed while streaming")
+                    self._condition.wait(remaining)
+                pieces = self.pieces[sent:]
+                done, error = self.done, self.error
+            for piece in pieces:
+                yield piece
+            sent += len(pieces)
+            if done and sent == len(self.pieces):
+                if error is not None:
+                    raise error
+                return
+
+
+class LLMDispatcher:
+    """Runs upstream LLM calls on a bounded pool with deadlines, retries and single-flight dedupe.
+
+    Callers asking the same question while a call for it is running share
+    that call instead of starting their own. When the pool and its queue
+    are full, or the deadline passes, the caller gets the fallback at once.
+    Streamed answers take a pool slot the same way, see stream().
+    """
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, max_waiting=DEFAULT_MAX_WAITING,
+                 deadline=DEFAULT_DEADLINE, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 backoff=DEFAULT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.calls = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.failures = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="llm")
+        self._flights = {}
+        self._streams = {}
+        self._pending = 0
+        self._lock = threading.RLock()
+
+    def call(self, key, fn, fallback):
+        """Return fn(timeout) for `key`, or `fallback` if it cannot be had before the deadline.
+
+        fn gets the seconds left before the deadline so it can bound its own request.
+        """
+        deadline = time.monotonic() + self.deadline
+        with self._lock:
+            self.calls += 1
+            future = self._flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+            elif self._pending >= self.max_in_flight + self.max_waiting:
+                self.rejected += 1
+                return fallback
+            else:
+                self._pending += 1
+                future = self._executor.submit(self._run, fn, deadline)
+                self._flights[key] = future
+                future.add_done_callback(lambda done, key=key: self._finish(self._flights, key, done))
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+            return fallback
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            print(f"OpenAI API error: {e}")
+            return fallback
+
+    def stream(self, key, fn, fallback):
+        """Yield the pieces of the answer streamed by fn(timeout) for `key`, or `fallback` if none arrive in time.
+
+        fn opens the upstream stream and returns an iterator of text pieces.
+        Failures before the first piece are retried like call()'s; callers
+        asking the same question meanwhile follow the same stream from its
+        start. Nothing more is yielded once the deadline passes.
+        """
+        deadline = time.monotonic() + self.deadline
+        with self._lock:
+            self.calls += 1
+            flight = self._streams.get(key)
+            if flight is not None:
+                self.coalesced += 1
+            elif self._pending >= self.max_in_flight + self.max_waiting:
+                self.rejected += 1
+            else:
+                self._pending += 1
+                flight = self._streams[key] = StreamFlight()
+                future = self._executor.submit(self._run_stream, fn, deadline, flight)
+                future.add_done_callback(lambda done, key=key, flight=flight: self._finish(self._streams, key, flight))
+        if flight is None:
+            yield fallback
+            return
+        sent = False
+        try:
+            for piece in flight.follow(deadline):
+                sent = True
+                yield piece
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            print(f"OpenAI API error: {e}")
+        if not sent:
+            yield fallback
+
+    def stats(self):
+        """Counters and current load."""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "failures": self.failures,
+            "pending": self._pending,
+        }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _finish(self, flights, key, flight):
+        with self._lock:
+            self._pending -= 1
+            if flights.get(key) is flight:
+                del flights[key]
+
+    def _run_stream(self, fn, deadline, flight):
+        def start(timeout):
+            pieces = iter(fn(timeout))
+            return next(pieces, None), pieces
+
+        try:
+            first, rest = self._run(start, deadline)
+            try:
+                if first is not None:
+                    flight.add(first)
+                    for piece in rest:
+                        if time.monotonic() >= deadline:
+                            break
+                        flight.add(piece)
+            finally:
+                # Stops the upstream stream if the deadline cut it short
+                close = getattr(rest, "close", None)
+                if close is not None:
+                    close()
+        except Exception as e:
+            flight.finish(e)
+            return
+        flight.finish()
+
+    def _run(self, fn, deadline):
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("deadline passed while the call was queued")
+            try:
+                return fn(remaining)
+            except Exception as e:
+                attempt += 1
+                if attempt >= self.max_attempts or not is_retryable(e):
+                    raise
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+                delay = max(delay, retry_after(e) or 0)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
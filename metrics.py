@@ -0,0 +1,139 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds; the LLM stage needs the long tail up to a minute
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROWS_BUCKETS = (0, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000)
+
+_metrics = []   # every metric, in the order /metrics lists them
+_local = threading.local()
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name, _label_text(self.labels, label_values), value
+
+
+class Histogram:
+    """Observations counted into cumulative buckets, with their sum, optionally split by labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}   # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        for label_values, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                yield f"{self.name}_bucket", _label_text(self.labels + ("le",), label_values + (le,)), cumulative
+            yield f"{self.name}_sum", _label_text(self.labels, label_values), counts[-1]
+            yield f"{self.name}_count", _label_text(self.labels, label_values), cumulative
+
+
+REQUEST_SECONDS = Histogram("chat_request_seconds", "Time to answer a chat message, by intent.", ["intent"])
+STAGE_SECONDS = Histogram("chat_stage_seconds", "Time spent in each stage of answering a message.", ["stage"])
+REQUESTS = Counter("chat_requests_total", "Chat messages answered, by intent.", ["intent"])
+LLM_CACHE = Counter("chat_llm_cache_total", "LLM response cache lookups, by result.", ["result"])
+ROWS_SCORED = Histogram("chat_search_rows_scored", "Products fuzzy scored per search.", buckets=ROWS_BUCKETS)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def start_request():
+    """Start timing a request on this thread, unless one is already being timed."""
+    if getattr(_local, "started", None) is None:
+        _local.started = time.perf_counter()
+        _local.stages = {}
+        _local.intent = None
+
+
+def label_request(intent):
+    """Name the intent the current request was answered as."""
+    _local.intent = intent
+
+
+def finish_request():
+    """Stop timing this thread's request; returns (seconds, intent, {stage: seconds}) or None."""
+    started = getattr(_local, "started", None)
+    if started is None:
+        return None
+    _local.started = None
+    return time.perf_counter() - started, _local.intent, _local.stages
+
+
+@contextmanager
+def span(stage):
+    """Time a block as `stage`, adding it to the current request's breakdown if there is one."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage)
+        if getattr(_local, "started", None) is not None:
+            _local.stages[stage] = _local.stages.get(stage, 0.0) + elapsed
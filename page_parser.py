@@ -0,0 +1,194 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+    from lxml.cssselect import CSSSelector
+except ImportError:  # lxml or cssselect missing; BeautifulSoup still works
+    lxml_html = None
+
+# Define CSS selectors for various product components
+PRODUCT_LINK_SELECTORS = ['.product-block__image__link', '.grid-product__link', '.product-card__link']
+NAME_SELECTORS = ['.product-title', '.product__title', '.product-single__title', '.product-card__name']
+PRICE_SELECTORS = ['.money', '.price', '.product__price', '.product-card__price']
+DESCRIPTION_SELECTORS = ['.product-description', '.product__description', '.product-single__description']
+COLOR_SELECTOR = "div.swatch__element[data-value], .color-swatch"
+SIZE_SELECTOR = "select[data-single-option-selector] option"
+STOCK_STATUS_SELECTOR = "span[data-add-to-cart-text]"  # Selector for stock status
+NO_DATA = "No data available"
+
+# Pages handed to each worker process at a time by ProductParser.map
+PARSE_CHUNK_SIZE = 16
+
+
+def get_first_matching_element(soup_element, selectors, attribute=None):
+    """Retrieve the first matching element based on a list of CSS selectors."""
+    for selector in selectors:
+        element = soup_element.select_one(selector)
+        if element:
+            return element[attribute].strip() if attribute else element.get_text(strip=True)
+    return NO_DATA
+
+
+def get_all_matching_elements(soup, selector, attribute=None):
+    """Retrieve all matching elements based on a CSS selector."""
+    elements = soup.select(selector)
+    return [element[attribute].strip() if attribute else element.get_text(strip=True) for element in elements if element]
+
+
+def stock_status_from_text(stock_text):
+    if "Add to Cart" in stock_text:
+        return "In Stock"
+    if "Sold Out" in stock_text:
+        return "Out of Stock"
+    return "Unknown"
+
+
+def parse_product(soup, url):
+    """Extract the product fields from a BeautifulSoup product page."""
+    stock_status_element = soup.select_one(STOCK_STATUS_SELECTOR)
+    stock_status = stock_status_from_text(stock_status_element.get_text(strip=True)) if stock_status_element else "Unknown"
+    return {
+        "name": get_first_matching_element(soup, NAME_SELECTORS),
+        "price": get_first_matching_element(soup, PRICE_SELECTORS),
+        "description": get_first_matching_element(soup, DESCRIPTION_SELECTORS),
+        "colors": ", ".join(get_all_matching_elements(soup, COLOR_SELECTOR, attribute="data-value")),
+        "sizes": ", ".join(get_all_matching_elements(soup, SIZE_SELECTOR)),
+        "stock_status": stock_status,
+        "url": url,
+    }
+
+
+def extract_product_bs4(html, url):
+    # Normalize newlines the way browsers (and lxml) do before parsing, so
+    # CRLF pages give the same text with either backend
+    html = html.replace("\r\n", "\n").replace("\r", "\n")
+    return parse_product(BeautifulSoup(html, 'html.parser'), url)
+
+
+# BeautifulSoup's get_text leaves out strings whose parent is one of these
+NON_TEXT_TAGS = {"script", "style", "template", "rt", "rp"}
+
+
+def _lxml_text(element):
+    """The text BeautifulSoup's get_text(strip=True) returns for the same element."""
+    parts = []
+    if element.text:
+        parts.append(element.text.strip())
+    for node in element.iterdescendants():
+        if node.text and isinstance(node.tag, str) and node.tag not in NON_TEXT_TAGS:
+            parts.append(node.text.strip())
+        if node.tail:
+            parts.append(node.tail.strip())
+    return "".join(parts)
+
+
+def _lxml_attribute(element, attribute):
+    value = element.get(attribute)
+    if value is None:
+        raise KeyError(attribute)  # as BeautifulSoup's element[attribute] does
+    return value.strip()
+
+
+class LxmlExtractor:
+    """Product extraction on lxml trees with the selectors compiled to XPath once, at import."""
+
+    def __init__(self):
+        # select_one keeps only the first match in document order, which "(path)[1]" gives directly
+        def first(selector):
+            return etree.XPath(f"({CSSSelector(selector, translator='html').path})[1]")
+
+        self.name = [first(s) for s in NAME_SELECTORS]
+        self.price = [first(s) for s in PRICE_SELECTORS]
+        self.description = [first(s) for s in DESCRIPTION_SELECTORS]
+        self.stock_status = first(STOCK_STATUS_SELECTOR)
+        self.colors = CSSSelector(COLOR_SELECTOR, translator='html')
+        self.sizes = CSSSelector(SIZE_SELECTOR, translator='html')
+
+    @staticmethod
+    def _first_text(root, selectors):
+        for selector in selectors:
+            found = selector(root)
+            if found:
+                return _lxml_text(found[0])
+        return NO_DATA
+
+    @staticmethod
+    def _parse(html):
+        try:
+            return lxml_html.document_fromstring(html)
+        except ValueError:
+            # Unicode strings with an XML encoding declaration have to go in as bytes
+            return lxml_html.document_fromstring(html.encode("utf-8"))
+        except etree.ParserError:
+            return lxml_html.document_fromstring("<html></html>")  # empty page
+
+    def __call__(self, html, url):
+        root = self._parse(html)
+        stock = self.stock_status(root)
+        return {
+            "name": self._first_text(root, self.name),
+            "price": self._first_text(root, self.price),
+            "description": self._first_text(root, self.description),
+            "colors": ", ".join(_lxml_attribute(element, "data-value") for element in self.colors(root)),
+            "sizes": ", ".join(_lxml_text(element) for element in self.sizes(root)),
+            "stock_status": stock_status_from_text(_lxml_text(stock[0])) if stock else "Unknown",
+            "url": url,
+        }
+
+
+BACKENDS = {"bs4": extract_product_bs4}
+if lxml_html is not None:
+    BACKENDS["lxml"] = LxmlExtractor()
+DEFAULT_BACKEND = "lxml" if "lxml" in BACKENDS else "bs4"
+
+
+def extract_product(html, url, backend=DEFAULT_BACKEND):
+    """Turn product page HTML into a product dict with the named backend."""
+    return BACKENDS[backend](html, url)
+
+
+class ProductParser:
+    """Product page parsing with a chosen backend, in worker processes when `processes` > 0.
+
+    The pool is started on first use with the spawn method, which is safe
+    from a multi-threaded crawler and is what Windows uses anyway. With
+    processes=0 pages are parsed in the calling thread.
+    """
+
+    def __init__(self, backend=DEFAULT_BACKEND, processes=0):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown parser backend {backend!r}; available: {', '.join(BACKENDS)}")
+        self.backend = backend
+        self.processes = processes
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def parse(self, html, url):
+        if not self.processes:
+            return extract_product(html, url, self.backend)
+        return self._executor().submit(extract_product, html, url, self.backend).result()
+
+    def map(self, pages):
+        """Parse (html, url) pairs, yielding product dicts in order."""
+        if not self.processes:
+            return (extract_product(html, url, self.backend) for html, url in pages)
+        htmls, urls = zip(*pages) if pages else ((), ())
+        return self._executor().map(extract_product, htmls, urls, repeat(self.backend), chunksize=PARSE_CHUNK_SIZE)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
@@ -0,0 +1,242 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+
+from app.database_management import PRODUCT_COLUMNS, Product
+
+SNAPSHOT_MAGIC = b"PRODSNAP1\n"
+# Text columns with at most this share of distinct values are stored as codes into one copy of each value
+CODED_SHARE = 0.25
+NULL_INT = -2 ** 63  # stands for NULL in integer columns
+INT_COLUMNS = {"id", "price_minor"}
+
+
+class TextColumn:
+    """Strings packed end to end into one UTF-8 buffer, with an array of where each one ends.
+
+    Missing values read back as empty strings.
+    """
+
+    kind = "text"
+
+    def __init__(self, data, ends):
+        self.data = data
+        self.ends = ends
+
+    @classmethod
+    def build(cls, values):
+        ends = array("Q")
+        parts = []
+        end = 0
+        for value in values:
+            encoded = ("" if value is None else str(value)).encode("utf-8")
+            parts.append(encoded)
+            end += len(encoded)
+            ends.append(end)
+        return cls(b"".join(parts), ends)
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getitem__(self, offset):
+        start = self.ends[offset - 1] if offset else 0
+        return str(self.data[start:self.ends[offset]], "utf-8")
+
+    def __iter__(self):
+        return (self[offset] for offset in range(len(self)))
+
+    def sections(self, prefix):
+        return {f"{prefix}.data": (self.data, "B"), f"{prefix}.ends": (self.ends, "Q")}
+
+    @classmethod
+    def from_sections(cls, sections, prefix):
+        return cls(sections[f"{prefix}.data"], sections[f"{prefix}.ends"])
+
+
+class CodedColumn:
+    """Repetitive strings (colors, sizes, stock) stored once each, with one small code per row.
+
+    The distinct values are packed in a TextColumn rather than kept as str
+    objects, whose refcount updates would copy their pages into every worker.
+    """
+
+    kind = "coded"
+
+    def __init__(self, values, codes):
+        self.values = values
+        self.codes = codes
+
+    @classmethod
+    def build(cls, values):
+        lookup = {}
+        codes = array("I")
+        for value in values:
+            value = "" if value is None else str(value)
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(lookup)
+            codes.append(code)
+        return cls(TextColumn.build(lookup), codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, offset):
+        return self.values[self.codes[offset]]
+
+    def sections(self, prefix):
+        return {**self.values.sections(f"{prefix}.values"), f"{prefix}.codes": (self.codes, "I")}
+
+    @classmethod
+    def from_sections(cls, sections, prefix):
+        return cls(TextColumn.from_sections(sections, f"{prefix}.values"), sections[f"{prefix}.codes"])
+
+
+class IntColumn:
+    """64-bit integers in an array, with NULL_INT standing for NULL."""
+
+    kind = "int"
+
+    def __init__(self, values):
+        self.values = values
+
+    @classmethod
+    def build(cls, values):
+        return cls(array("q", (NULL_INT if value is None else value for value in values)))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, offset):
+        value = self.values[offset]
+        return None if value == NULL_INT else value
+
+    def sections(self, prefix):
+        return {f"{prefix}.values": (self.values, "q")}
+
+    @classmethod
+    def from_sections(cls, sections, prefix):
+        return cls(sections[f"{prefix}.values"])
+
+
+COLUMN_KINDS = {column.kind: column for column in (TextColumn, CodedColumn, IntColumn)}
+
+
+def build_column(name, values):
+    """The most compact column for a product field's values."""
+    if name in INT_COLUMNS:
+        return IntColumn.build(values)
+    if len(set(values)) <= max(1, len(values) * CODED_SHARE):
+        return CodedColumn.build(values)
+    return TextColumn.build(values)
+
+
+class ProductStore:
+    """Product rows held column by column, with no Python object per row or per field.
+
+    Rows are sorted by id, so an id is found by binary search instead of a
+    dict. Indexing by offset, or get() by id, builds a Product on demand.
+    The columns are plain buffers, so they can be written to a snapshot
+    with write_snapshot and used in place from its memory map: workers then
+    share the pages through the OS cache, and opening costs no parsing.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns   # field name -> column, in PRODUCT_COLUMNS order
+        self._ordered = [columns[name] for name in PRODUCT_COLUMNS]
+        self.ids = columns["id"].values
+
+    @classmethod
+    def from_rows(cls, rows, columns=PRODUCT_COLUMNS):
+        """Build a store from row tuples with the given column names; missing fields are NULL."""
+        positions = [columns.index(name) if name in columns else None for name in PRODUCT_COLUMNS]
+        rows = sorted(rows, key=lambda row: row[positions[0]])
+        return cls({
+            name: build_column(name, [None if position is None else row[position] for row in rows])
+            for name, position in zip(PRODUCT_COLUMNS, positions)
+        })
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, offset):
+        return Product._make([column[offset] for column in self._ordered])
+
+    def __iter__(self):
+        return (self[offset] for offset in range(len(self)))
+
+    def offset_of(self, product_id):
+        """Row offset of a product id, or None."""
+        offset = bisect_left(self.ids, product_id)
+        if offset < len(self.ids) and self.ids[offset] == product_id:
+            return offset
+        return None
+
+    def get(self, product_id):
+        """Return the Product with this id, or None."""
+        offset = self.offset_of(product_id)
+        return None if offset is None else self[offset]
+
+    def snapshot_parts(self):
+        """({field name: column kind}, {section name: (buffer, typecode)}) for write_snapshot."""
+        kinds, sections = {}, {}
+        for name, column in self.columns.items():
+            kinds[name] = column.kind
+            sections.update(column.sections(name))
+        return kinds, sections
+
+    @classmethod
+    def from_snapshot(cls, kinds, sections):
+        """A store over the sections of a mapped snapshot."""
+        return cls({name: COLUMN_KINDS[kind].from_sections(sections, name) for name, kind in kinds.items()})
+
+
+def write_snapshot(path, header, sections):
+    """Write a JSON header and named (buffer, typecode) sections to `path`, atomically.
+
+    Each section starts 8-byte aligned so it can be cast in place when mapped.
+    """
+    layout, position = {}, 0
+    for name, (buffer, typecode) in sections.items():
+        size = memoryview(buffer).nbytes
+        layout[name] = [position, size, typecode]
+        position += (size + 7) // 8 * 8
+    header = json.dumps({**header, "sections": layout}).encode("utf-8")
+    start = len(SNAPSHOT_MAGIC) + 8 + len(header)
+    padding = -start % 8
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(SNAPSHOT_MAGIC)
+        file.write(struct.pack("<Q", len(header) + padding))
+        file.write(header + b" " * padding)
+        for name, (buffer, typecode) in sections.items():
+            data = memoryview(buffer).cast("B")
+            file.write(data)
+            file.write(b"\0" * (-len(data) % 8))
+    os.replace(temporary, path)
+
+
+def open_snapshot(path):
+    """Map a snapshot file; returns (header, {section name: memoryview}) or None if it is missing or not a snapshot."""
+    try:
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+    if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        mapped.close()
+        return None
+    position = len(SNAPSHOT_MAGIC)
+    (header_size,) = struct.unpack_from("<Q", mapped, position)
+    position += 8
+    header = json.loads(mapped[position:position + header_size])
+    base = position + header_size
+    view = memoryview(mapped)
+    sections = {}
+    for name, (start, size, typecode) in header.pop("sections").items():
+        section = view[base + start:base + start + size]
+        sections[name] = section if typecode == "B" else section.cast(typecode)
+    return header, sections
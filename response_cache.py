@@ -0,0 +1,180 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from fuzzywuzzy import fuzz
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 24 * 60 * 60  # seconds a cached answer stays valid
+# Similarity (fuzz.ratio of their signatures) a new message needs to a cached one to reuse its answer.
+# Whole signatures are compared, so a message adding or negating words is a different question.
+NEAR_DUPLICATE_THRESHOLD = 90
+STOPWORDS = {
+    "a", "an", "the", "do", "does", "did", "you", "your", "we", "i", "me", "my", "is", "are", "can", "could",
+    "please", "pls", "guys", "what", "whats", "s", "to", "of", "for", "on", "in", "it", "any", "have", "there",
+    "hi", "hello", "hey", "tell", "about", "and", "or",
+}
+
+_punctuation = re.compile(r"[^\w\s]+")
+
+
+def normalize(text):
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(_punctuation.sub(" ", text.lower()).split())
+
+
+def signature(normalized):
+    """Order-insensitive content words, so rephrasings like "do you ship?" and "ship, do you?" can meet."""
+    return " ".join(sorted({word for word in normalized.split() if word not in STOPWORDS}))
+
+
+def _digest(*parts):
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of chatbot answers with a TTL, optionally persisted to SQLite.
+
+    Entries are keyed on the normalized message plus the model and system prompt,
+    so changing either never serves a stale answer. With `near_duplicates` on,
+    messages with the same content words or a close fuzzy match share an answer.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, db_file=None, near_duplicates=False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_file = db_file
+        self.near_duplicates = near_duplicates
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, scope, normalized, signature key, response)
+        self._signatures = {}          # signature key -> key
+        self._lock = threading.Lock()
+        if db_file:
+            conn = sqlite3.connect(db_file)
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        signature_key TEXT NOT NULL,
+                        scope TEXT NOT NULL,
+                        message TEXT NOT NULL,
+                        response TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS responses_signature ON responses(signature_key)")
+            conn.close()
+
+    def get(self, message, model, system_prompt):
+        """Return the cached answer for a message, or None."""
+        scope = _digest(model, system_prompt)
+        normalized = normalize(message)
+        key = _digest(scope, normalized)
+        signature_key = _digest(scope, signature(normalized))
+        now = time.time()
+        with self._lock:
+            response = self._lookup(key, now)
+            if response is None and self.near_duplicates:
+                response = self._lookup(self._signatures.get(signature_key), now)
+                if response is None:
+                    response = self._closest(scope, normalized, now)
+                if response is not None:
+                    self.near_hits += 1
+            if response is None and self.db_file:
+                response = self._load(key, signature_key, now)
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return response
+
+    def put(self, message, model, system_prompt, response):
+        """Cache an answer for a message."""
+        scope = _digest(model, system_prompt)
+        normalized = normalize(message)
+        key = _digest(scope, normalized)
+        signature_key = _digest(scope, signature(normalized))
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, scope, normalized, signature_key, response, expires_at)
+        if self.db_file:
+            conn = sqlite3.connect(self.db_file, timeout=5)
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, signature_key, scope, normalized, response, expires_at),
+                    )
+                    conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            except sqlite3.Error as e:
+                print(f"Response cache error: {e}")
+            finally:
+                conn.close()
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        return {"hits": self.hits, "near_hits": self.near_hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._signatures.clear()
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key) if key else None
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[4]
+
+    def _closest(self, scope, normalized, now):
+        wanted = signature(normalized)
+        best_key, best_score = None, NEAR_DUPLICATE_THRESHOLD - 1
+        for key, (expires_at, entry_scope, entry_normalized, _, _) in self._entries.items():
+            if entry_scope == scope and expires_at > now:
+                score = fuzz.ratio(wanted, signature(entry_normalized))
+                if score > best_score:
+                    best_key, best_score = key, score
+        return self._lookup(best_key, now)
+
+    def _store(self, key, scope, normalized, signature_key, response, expires_at):
+        self._entries[key] = (expires_at, scope, normalized, signature_key, response)
+        self._entries.move_to_end(key)
+        self._signatures[signature_key] = key
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        entry = self._entries.pop(key)
+        if self._signatures.get(entry[3]) == key:
+            del self._signatures[entry[3]]
+
+    def _load(self, key, signature_key, now):
+        """Fall back to the SQLite file, promoting a hit into memory."""
+        conn = sqlite3.connect(self.db_file, timeout=5)
+        try:
+            query = "SELECT key, scope, message, signature_key, response, expires_at FROM responses WHERE key = ?"
+            params = (key,)
+            if self.near_duplicates:
+                query += " OR signature_key = ?"
+                params = (key, signature_key)
+            row = conn.execute(query + " ORDER BY key = ? DESC LIMIT 1", params + (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Response cache error: {e}")
+            return None
+        finally:
+            conn.close()
+        if row is None or row[5] <= now:
+            return None
+        if row[0] != key:
+            self.near_hits += 1
+        self._store(row[0], row[1], row[2], row[3], row[4], row[5])
+        return row[4]
@@ -0,0 +1,192 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_TTL = 30 * 60  # seconds a search result set lives after its last use
+
+
+class ResultSet:
+    """Product ids from one search plus the page cursor, with a name lookup for selection."""
+
+    def __init__(self, ids, names, page=1):
+        self.ids = list(ids)
+        self.names = list(names)
+        self.page = page
+        self._lowered = [name.strip().lower() for name in self.names]
+        self._by_name = {}
+        for product_id, name in zip(self.ids, self._lowered):
+            self._by_name.setdefault(name, product_id)
+
+    @classmethod
+    def from_products(cls, products):
+        """Build a result set from ranked Products."""
+        return cls([product.id for product in products], [product.name for product in products])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def page_count(self, page_size):
+        return (len(self.ids) + page_size - 1) // page_size
+
+    def page_names(self, page, page_size):
+        """Names of the products shown on a 1-based page."""
+        start = (page - 1) * page_size
+        return self.names[start:start + page_size]
+
+    def find(self, text):
+        """Return the id of the product named `text`, else of the first whose name contains it."""
+        product_id = self._by_name.get(text)
+        if product_id is not None:
+            return product_id
+        for product_id, name in zip(self.ids, self._lowered):
+            if text in name:
+                return product_id
+        return None
+
+    def to_dict(self):
+        return {"ids": self.ids, "names": self.names, "page": self.page}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["ids"], data["names"], data.get("page", 1))
+
+
+class History:
+    """The latest messages of a conversation, as [role, text] pairs, for LLM prompts."""
+
+    def __init__(self, messages=()):
+        self.messages = [list(message) for message in messages]
+
+    def add(self, role, text, limit):
+        """Append a message, keeping only the last `limit`."""
+        self.messages.append([role, text])
+        del self.messages[:-limit]
+
+    def to_dict(self):
+        return {"messages": self.messages}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["messages"])
+
+
+class MemoryResultStore:
+    """In-process LRU store of result sets, or histories, with a sliding TTL."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, result_set = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries[key] = (now + self.ttl, result_set)
+            self._entries.move_to_end(key)
+            return result_set
+
+    def put(self, key, result_set):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, result_set)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteResultStore:
+    """Result sets in a local SQLite file, shared by every worker process on the host.
+
+    Pass another `table` and `value_type` (such as History) to keep other
+    per-session values the same way; values need to_dict() and from_dict().
+    """
+
+    def __init__(self, db_file, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, table="result_sets", value_type=ResultSet):
+        self.db_file = db_file
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.table = table
+        self.value_type = value_type
+        conn = self._connect()
+        with conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    used_at REAL NOT NULL
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_used_at ON {table}(used_at)")
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_file, timeout=5)
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute(
+                    f"SELECT data FROM {self.table} WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    f"UPDATE {self.table} SET expires_at = ?, used_at = ? WHERE key = ?", (now + self.ttl, now, key)
+                )
+            return self.value_type.from_dict(json.loads(row[0]))
+        finally:
+            conn.close()
+
+    def put(self, key, result_set):
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, data, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(result_set.to_dict()), now + self.ttl, now),
+                )
+                conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+                conn.execute(f"""
+                    DELETE FROM {self.table} WHERE key IN (
+                        SELECT key FROM {self.table} ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+        finally:
+            conn.close()
+
+    def delete(self, key):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        finally:
+            conn.close()
+
+    def __len__(self):
+        conn = self._connect()
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        finally:
+            conn.close()
@@ -1,8 +1,16 @@
-from flask import Blueprint, request, jsonify, session, render_template
-from app.chat import is_product_query, get_ai_response
-from fuzzywuzzy import fuzz
-import sqlite3
+from flask import Blueprint, Response, g, request, jsonify, session, render_template
+from flask.sessions import SecureCookieSessionInterface
+from app.chat import HISTORY_MESSAGE_CHARS, clip, get_ai_response, stream_ai_response
+from app.database_management import PRODUCT_COLUMNS, fetch_product_by_id, parse_price, search_by_facets, search_products
+from app.facets import get_facet_parser
+from app.intents import classify
+from app.metrics import REQUEST_SECONDS, REQUESTS, finish_request, label_request, render, span, start_request
+from app.result_store import History, MemoryResultStore, ResultSet
+from app.search_index import get_search_index, rank_products
+import json
 import os
+import time
+import uuid
 
 # Create a Blueprint for the main routes
 main = Blueprint("main", __name__)
@@ -10,40 +18,126 @@ main = Blueprint("main", __name__)
 # Database path
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 DATABASE_PATH = os.path.join(BASE_DIR, "ecommerce_products.db")
+# "index" keeps an in-memory trigram index per worker, "fts" asks SQLite's FTS5 table
+# (see database_management.create_search_index) for bm25-ranked candidates
+SEARCH_BACKEND = "index"
+# Search results live server-side, keyed by session id; swap in
+# result_store.SQLiteResultStore to share them across worker processes
+RESULT_STORE = MemoryResultStore()
+# The recent conversation for LLM prompts, kept server-side the same way
+HISTORY_STORE = MemoryResultStore()
+# Print the stage breakdown of /get requests slower than this many seconds; None turns it off
+SLOW_REQUEST_SECONDS = None
+# LLM prompts get at most this many matching products, each with a name at least this close to the message
+PROMPT_PRODUCTS = 5
+PROMPT_MATCH_SCORE = 70
+# Messages of the conversation kept in the session for LLM prompts
+HISTORY_MESSAGES = 6
 
-# Fetch products with fuzzy matching
+# Answers to questions about the selected product, by intent
+PRODUCT_ANSWERS = {
+    "ask_sizes": "The available sizes for {name} are: {value}.",
+    "ask_price": "The price of {name} is: {value}.",
+    "ask_colors": "The available colors for {name} are: {value}.",
+    "ask_description": "Here is the description for {name}: {value}.",
+    "ask_link": "You can find {name} here: {value}.",
+    "product_field": "The {field} of {name} is: {value}",
+}
+
+# Fetch products with fuzzy matching, scoring only the rows that can match
 def fetch_products_by_name(database_path, query):
     try:
-        connection = sqlite3.connect(database_path)
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM products")
-        columns = [column[0] for column in cursor.description]
-        all_products = cursor.fetchall()
-        connection.close()
-
-        matches = []
-        for product in all_products:
-            name_match = fuzz.partial_ratio(query.lower(), product[1].lower())
-            description_match = fuzz.partial_ratio(query.lower(), product[3].lower())
-            if name_match > 52 or description_match > 52:
-                matches.append((name_match + description_match, product))
-
-        matches.sort(reverse=True, key=lambda x: x[0])
-        return [match[1] for match in matches], columns
+        if SEARCH_BACKEND == "fts":
+            candidates = search_products(database_path, query)
+            with span("score"):
+                return rank_products(query, candidates), PRODUCT_COLUMNS
+        index = get_search_index(database_path)
+        with span("score"):
+            return index.search(query), PRODUCT_COLUMNS
     except Exception as e:
         print(f"Database error: {e}")
         return [], []
 
+def prompt_products(database_path, query):
+    """The few products closest to a message, to ground an LLM answer; cheap even for vague messages."""
+    try:
+        if SEARCH_BACKEND == "fts":
+            candidates = search_products(database_path, query)
+            with span("score"):
+                return rank_products(query, candidates, limit=PROMPT_PRODUCTS)
+        index = get_search_index(database_path)
+        with span("score"):
+            return index.closest(query, PROMPT_PRODUCTS, min_name_score=PROMPT_MATCH_SCORE)
+    except Exception as e:
+        print(f"Database error: {e}")
+        return []
+
+def fetch_products_by_facets(database_path, query):
+    """Filter products by color, size and price in SQL, then rank them by any free text.
+
+    Returns None when the message names no size or price, the facet tables
+    are missing or nothing matches, so the caller can fall back to name search.
+    """
+    try:
+        facets = get_facet_parser(database_path).parse(query)
+        if facets is None:
+            return None
+        products = search_by_facets(database_path, facets.colors, facets.sizes, facets.min_price, facets.max_price)
+        if facets.text:
+            with span("score"):
+                products = rank_products(facets.text, products)
+        if not products:
+            return None
+        return products, PRODUCT_COLUMNS
+    except Exception as e:
+        print(f"Database error: {e}")
+        return None
+
+def price_minor(product):
+    """A Product's or cart item's price in minor units, parsing the text for rows stored before it was typed."""
+    if isinstance(product, dict):
+        value, text = product.get("price_minor"), product.get("price")
+    else:
+        value, text = product.price_minor, product.price
+    return value if value is not None else (parse_price(text)[0] or 0)
+
+def cart_total(cart):
+    return f"LE {sum(price_minor(item) for item in cart) / 100:.2f}"
+
+def get_product(database_path, product_id):
+    """Look up a product row by id from the active search backend."""
+    if product_id is None:
+        return None
+    try:
+        if SEARCH_BACKEND == "fts":
+            return fetch_product_by_id(database_path, product_id)
+        return get_search_index(database_path).get(product_id)
+    except Exception as e:
+        print(f"Database error: {e}")
+        return None
+
+class TimedSessionInterface(SecureCookieSessionInterface):
+    """The default signed-cookie sessions, with loading and saving timed as request stages."""
+
+    def open_session(self, app, request):
+        start_request()  # sessions open first thing in a request, so its timing starts here
+        with span("session_load"):
+            return super().open_session(app, request)
+
+    def save_session(self, app, session, response):
+        with span("session_save"):
+            return super().save_session(app, session, response)
+
 @main.before_request
 def initialize_session():
     """Initialize session variables."""
+    start_request()
     if "cart" not in session:
         session["cart"] = []  # Initialize empty cart
-    if "products" not in session:
-        session["products"] = []
-    session.setdefault("current_page", 1)
+    if "sid" not in session:
+        session["sid"] = uuid.uuid4().hex  # Key for the server-side search results and history
     session.setdefault("awaiting_product_selection", False)
-    session.setdefault("last_selected_product", None)
+    session.setdefault("last_selected_product_id", None)
     session.setdefault("filtered_products", [])
     session.setdefault("comparison_mode", False)
 
@@ -57,7 +151,7 @@ def get_cart():
     """Fetch the cart details."""
     cart = session.get("cart", [])
     try:
-        total = sum([float(item["price"].replace("LE", "").replace(",", "").strip()) for item in cart])
+        total = cart_total(cart)
         cart_details = []
         for item in cart:
             product_url = item.get("url")
@@ -70,222 +164,229 @@ def get_cart():
                 "url": product_url,
                 "id": item.get("id")
             })
-        return jsonify({"cart": cart_details, "total": f"LE {total:.2f}"})
+        return jsonify({"cart": cart_details, "total": total})
     except ValueError as e:
         print(f"Error calculating total: {e}")
         return jsonify({"cart": [], "total": "LE 0.00"})
 
-@main.route("/get", methods=["POST"])
-def chat():
-    """Handle user queries and product exploration."""
-    user_input = request.form.get("msg").strip().lower()
+def answer_message(user_input):
+    """Answer a normalized message from the rules and catalog, or return None when it needs the LLM."""
     if not user_input:
-        return jsonify({"response": "Please provide a valid input.", "enableNext": False, "updateCart": False})
+        label_request("empty")
+        return {"response": "Please provide a valid input.", "enableNext": False, "updateCart": False}
 
-    user_input = " ".join(user_input.split()).lower()
-
-    products = session.get("products", [])
+    results = RESULT_STORE.get(session["sid"]) or ResultSet([], [])
     cart = session.get("cart", [])
-    last_selected_product = session.get("last_selected_product", None)
+    last_selected_product = get_product(DATABASE_PATH, session.get("last_selected_product_id"))
     page_size = 5
 
-    # Check if user is asking about a product's details
-    if last_selected_product:
-        product_details = {
-            "name": last_selected_product[1],
-            "price": last_selected_product[2],
-            "description": last_selected_product[3],
-            "colors": last_selected_product[4],
-            "sizes": last_selected_product[5],
-            "stock_status": last_selected_product[6],
-            "url": last_selected_product[7]
-        }
-        for key in product_details.keys():
-            if key in user_input:
-                return jsonify({"response": f"The {key} of {last_selected_product[1]} is: {product_details[key]}", "updateCart": False})
-
-    if (
-    user_input == "reset my cart" or
-    user_input == "clear my cart" or
-    user_input == "empty my cart" or
-    user_input == "reset cart" or
-    user_input == "clear cart" or
-    user_input == "empty cart"
-):
+    with span("intent"):
+        route = classify(user_input)
+    label_request(route.intent)
+
+    # Questions about the selected product's details
+    if last_selected_product and route.field:
+        value = getattr(last_selected_product, route.field)
+        response = PRODUCT_ANSWERS[route.intent].format(field=route.field, name=last_selected_product.name, value=value)
+        return {"response": response, "updateCart": False}
 
+    if route.intent == "cart_clear":
         session["cart"] = []
-        return jsonify({"response": "Your cart has been cleared.", "updateCart": True})
-
-    if (
-    user_input == "what is in my cart" or
-    user_input == "show my cart" or
-    user_input == "what's in my cart" or
-    user_input == "show cart" or
-    user_input == "view my cart" or
-    user_input == "view cart" or
-    user_input == "cart"
-):
+        return {"response": "Your cart has been cleared.", "updateCart": True}
 
+    if route.intent == "cart_view":
         if not cart:
-            return jsonify({"response": "Your cart is empty.", "updateCart": False})
+            return {"response": "Your cart is empty.", "updateCart": False}
         response = "Your cart contains:\n"
         for item in cart:
             response += f"- {item['name']}: {item['price']}\nView Product: {item['url']}\n"
-        total = sum([float(item["price"].replace("LE", "").replace(",", "").strip()) for item in cart])
-        response += f"Total: LE {total:.2f}"
-        return jsonify({"response": response, "updateCart": False})
+        response += f"Total: {cart_total(cart)}"
+        return {"response": response, "updateCart": False}
 
     # Add product to the cart
-    if (
-    "add this product" in user_input or
-    "add it to the cart" in user_input or
-    "add it" in user_input or
-    "put it" in user_input or
-    "add to cart" in user_input or
-    "add to my cart" in user_input
-):
-
+    if route.intent == "cart_add":
         if last_selected_product:
             cart.append({
-                "name": last_selected_product[1],
-                "price": last_selected_product[2],
-                "url": last_selected_product[7]
+                "name": last_selected_product.name,
+                "price": last_selected_product.price,
+                "price_minor": price_minor(last_selected_product),
+                "url": last_selected_product.url
             })
             session["cart"] = cart
-            return jsonify({"response": f"Added {last_selected_product[1]} to your cart.", "updateCart": True})
+            return {"response": f"Added {last_selected_product.name} to your cart.", "updateCart": True}
         else:
-            return jsonify({"response": "Please select a product first before adding it to your cart.", "updateCart": False})
+            return {"response": "Please select a product first before adding it to your cart.", "updateCart": False}
 
     # Product search
-    selected_product = next((p for p in products if user_input in p[1].strip().lower()), None)
+    selected_product = get_product(DATABASE_PATH, results.find(user_input))
 
     if selected_product:
-        session["last_selected_product"] = selected_product
+        label_request("select")
+        session["last_selected_product_id"] = selected_product.id
         brief_response = (
-            f"Certainly! '{selected_product[1]}' is a popular item. It stands out for its {selected_product[4]}, "
-            f"color options and availability in {selected_product[5]} sizes, making it a favorite among our customers."
+            f"Certainly! '{selected_product.name}' is a popular item. It stands out for its {selected_product.colors}, "
+            f"color options and availability in {selected_product.sizes} sizes, making it a favorite among our customers."
         )
-        if selected_product[6].lower() == "out of stock":
+        if selected_product.stock_status.lower() == "out of stock":
             response = (
-                f"Here are the details for {selected_product[1]}:\n"
-                f"💲 Price: {selected_product[2]}\n"
-                f"📖 Description: {selected_product[3]}\n"
-                f"🎉 Colors: {selected_product[4]}\n"
-                f"🔠 Sizes: {selected_product[5]}\n"
-                f"The product '{selected_product[1]}' is currently out of stock."
+                f"Here are the details for {selected_product.name}:\n"
+                f"💲 Price: {selected_product.price}\n"
+                f"📖 Description: {selected_product.description}\n"
+                f"🎉 Colors: {selected_product.colors}\n"
+                f"🔠 Sizes: {selected_product.sizes}\n"
+                f"The product '{selected_product.name}' is currently out of stock."
             )
         else:
             response = (
-                f"Here are the details for {selected_product[1]}:\n"
-                f"💲 Price: {selected_product[2]}\n"
-                f"📖 Description: {selected_product[3]}\n"
-                f"🎉 Colors: {selected_product[4]}\n"
-                f"🔠 Sizes: {selected_product[5]}\n"
-                f"📦 Stock Status: {selected_product[6]}\n"
+                f"Here are the details for {selected_product.name}:\n"
+                f"💲 Price: {selected_product.price}\n"
+                f"📖 Description: {selected_product.description}\n"
+                f"🎉 Colors: {selected_product.colors}\n"
+                f"🔠 Sizes: {selected_product.sizes}\n"
+                f"📦 Stock Status: {selected_product.stock_status}\n"
             )
 
         # Add the prompt to add the product to the cart
         response += "\nsimply type add this product to the cart?."
 
-        checkout_links = f"Checkout URLs: {selected_product[7]}" if selected_product[7] else "No checkout URL available."
-        return jsonify({"response": f"{brief_response}\n\n{response}", "checkout_links": checkout_links, "updateCart": False})
+        checkout_links = f"Checkout URLs: {selected_product.url}" if selected_product.url else "No checkout URL available."
+        return {"response": f"{brief_response}\n\n{response}", "checkout_links": checkout_links, "updateCart": False}
 
     # Handle next page pagination
-    if user_input == "next":
-        total_pages = (len(products) + page_size - 1) // page_size
-        current_page = session["current_page"]
+    if route.intent == "next_page":
+        total_pages = results.page_count(page_size)
 
-        if current_page < total_pages:
-            session["current_page"] += 1
-            start = (session["current_page"] - 1) * page_size
-            end = start + page_size
-            products_on_page = products[start:end]
+        if results.page < total_pages:
+            results.page += 1
+            RESULT_STORE.put(session["sid"], results)
 
             response = "Here are more products:\n"
-            for product in products_on_page:
-                response += f"🛏️ {product[1]}\n"
+            for name in results.page_names(results.page, page_size):
+                response += f"🛏️ {name}\n"
             response += "Type the product name for more details."
-            return jsonify({"response": response.strip(), "enableNext": session["current_page"] < total_pages})
+            return {"response": response.strip(), "enableNext": results.page < total_pages}
 
     # Handle product query (search products)
-    if is_product_query(user_input):
-        products, columns = fetch_products_by_name(DATABASE_PATH, user_input)
+    if route.search:
+        # "red hoodies under 500 le in xl" filters on the typed facets; anything else, or a filter
+        # matching nothing, is a name search
+        found = fetch_products_by_facets(DATABASE_PATH, user_input)
+        products, columns = found if found is not None else fetch_products_by_name(DATABASE_PATH, user_input)
         if products:
-            session["products"] = products
-            session["current_page"] = 1
+            RESULT_STORE.put(session["sid"], ResultSet.from_products(products))
             response = "I found these products. Are you interested in any? Type the product name for more details:\n"
             for product in products[:5]:
-                response += f"🛏️ {product[1]}\n"
+                response += f"🛏️ {product.name}\n"
             if len(products) > 5:
                 response += "Reply 'Next' to see more products."
-            return jsonify({"response": response.strip(), "enableNext": len(products) > 5})
-
-        return jsonify({"response": "Sorry, I couldn't find any products matching your query."})
-
-    if (
-    "do they have sizes" in user_input or
-    "what sizes are available" in user_input or
-    "available sizes" in user_input or
-    "sizes available" in user_input or
-    "what sizes do they have" in user_input or
-    "do they have this size" in user_input or
-    "is this size available" in user_input or
-    "what are the sizes" in user_input
-):
-        if last_selected_product:
-            sizes = last_selected_product[5]
-            response = f"The available sizes for {last_selected_product[1]} are: {sizes}."
-            return jsonify({"response": response, "updateCart": False})
-    if (
-    "what is the price" in user_input or
-    "how much is it" in user_input or
-    "what's the price" in user_input or
-    "price of" in user_input or
-    "how much does it cost" in user_input
-):
-        if last_selected_product:
-            price = last_selected_product[2]
-            response = f"The price of {last_selected_product[1]} is: {price}."
-            return jsonify({"response": response, "updateCart": False})
-    if (
-    "do they have colors" in user_input or
-    "what colors are available" in user_input or
-    "available colors" in user_input or
-    "colors available" in user_input or
-    "what colors do they have" in user_input or
-    "is this color available" in user_input or
-    "what are the colors" in user_input
-):
-        if last_selected_product:
-            colors = last_selected_product[4]
-            response = f"The available colors for {last_selected_product[1]} are: {colors}."
-            return jsonify({"response": response, "updateCart": False})
-
-    if (
-    "what is the description" in user_input or
-    "tell me about it" in user_input or
-    "describe this product" in user_input or
-    "what does it do" in user_input or
-    "can you describe it" in user_input or
-    "details about the product" in user_input
-):
-        if last_selected_product:
-            description = last_selected_product[3]
-            response = f"Here is the description for {last_selected_product[1]}: {description}."
-            return jsonify({"response": response, "updateCart": False})
-
-    if (
-    "where can I buy it" in user_input or
-    "give me the link" in user_input or
-    "product URL" in user_input or
-    "show me the website" in user_input or
-    "where is it listed" in user_input or
-    "can I see the link" in user_input
-):
-        if last_selected_product:
-            url = last_selected_product[7]
-            response = f"You can find {last_selected_product[1]} here: {url}."
-            return jsonify({"response": response, "updateCart": False})
+            return {"response": response.strip(), "enableNext": len(products) > 5}
+
+        return {"response": "Sorry, I couldn't find any products matching your query."}
+
+    return None
+
+def llm_context(user_input):
+    """What grounds an LLM answer: matching products, the selected product and the recent conversation."""
+    return {
+        "products": prompt_products(DATABASE_PATH, user_input),
+        "selected_product": get_product(DATABASE_PATH, session.get("last_selected_product_id")),
+        "history": history_of(session["sid"]).messages,
+    }
+
+def history_of(sid):
+    return HISTORY_STORE.get(sid) or History()
+
+def remember(sid, user_input, response):
+    """Add an exchange to the session's conversation history, trimmed to the last HISTORY_MESSAGES."""
+    if not user_input:
+        return
+    history = history_of(sid)
+    history.add("user", clip(user_input, HISTORY_MESSAGE_CHARS), HISTORY_MESSAGES)
+    if response:
+        history.add("assistant", clip(response, HISTORY_MESSAGE_CHARS), HISTORY_MESSAGES)
+    HISTORY_STORE.put(sid, history)
+
+def _read_message():
+    """Read the posted message, lowercased and with whitespace collapsed."""
+    return " ".join(request.form.get("msg", "").split()).lower()
+
+def observe_request(seconds, intent, stages):
+    """Count and time a chat message by intent, and log it if slow."""
+    intent = intent or "unknown"
+    REQUESTS.inc(intent)
+    REQUEST_SECONDS.observe(seconds, intent)
+    if SLOW_REQUEST_SECONDS is not None and seconds >= SLOW_REQUEST_SECONDS:
+        breakdown = ", ".join(f"{stage} {elapsed * 1000:.1f} ms" for stage, elapsed in stages.items())
+        print(f"Slow request: {seconds * 1000:.1f} ms for {intent!r} ({breakdown})")
+
+@main.teardown_app_request
+def record_request(error=None):
+    """Stop timing every request once its response and session cookie are done, and record the chat ones.
+
+    Runs for the whole app, 404s and static files included, so no request
+    leaves its start time behind for the next one on the thread. A streamed
+    answer is still being generated here: its timing so far is handed to
+    the stream, which records the request when it ends.
+    """
+    timing = finish_request()
+    if timing is None or request.endpoint not in ("main.chat", "main.chat_stream"):
+        return
+    handoff = g.pop("stream_timing", None)
+    if handoff is not None:
+        handoff.append(timing)
+        return
+    observe_request(*timing)
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@main.route("/get", methods=["POST"])
+def chat():
+    """Handle user queries and product exploration."""
+    user_input = _read_message()
+    reply = answer_message(user_input)
+    if reply is None:
+        reply = {"response": get_ai_response(user_input, **llm_context(user_input)), "updateCart": False}
+    remember(session["sid"], user_input, reply["response"])
+    return jsonify(reply)
+
+@main.route("/metrics")
+def metrics():
+    """Request, stage, cache and search metrics of this process in the Prometheus text format."""
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+@main.route("/stream", methods=["POST"])
+def chat_stream():
+    """Like /get, but LLM answers arrive as server-sent "token" events while they are generated.
+
+    Rule-based answers are sent whole as a single "message" event.
+    """
+    user_input = _read_message()
+    sid = session["sid"]
+    reply = answer_message(user_input)
+    if reply is not None:
+        remember(sid, user_input, reply["response"])
+        events = [_sse("message", reply)]
+    else:
+        # Gathered now: the session is gone by the time the tokens are generated
+        context = llm_context(user_input)
+
+        timing = g.stream_timing = []  # filled in by record_request once the view returns
 
-    response = get_ai_response(user_input)
-    return jsonify({"response": response, "updateCart": False})
+        def stream_tokens():
+            pieces = []
+            started = time.perf_counter()
+            try:
+                with span("llm"):
+                    for piece in stream_ai_response(user_input, **context):
+                        pieces.append(piece)
+                        yield _sse("token", {"text": piece})
+                remember(sid, user_input, "".join(pieces))
+                yield _sse("done", {"updateCart": False})
+            finally:
+                if timing:
+                    seconds, intent, stages = timing[0]
+                    streamed = time.perf_counter() - started
+                    observe_request(seconds + streamed, intent, {**stages, "llm": streamed})
+        events = stream_tokens()
+    return Response(events, mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
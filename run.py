@@ -1,8 +1,9 @@
 from flask import Flask
-from app.routes import main
+from app.routes import TimedSessionInterface, main
 
 app = Flask(__name__)
 app.secret_key = "2041935"
+app.session_interface = TimedSessionInterface()
 # Register the Blueprint
 app.register_blueprint(main)
 
@@ -1,101 +1,138 @@
-import requests
 from bs4 import BeautifulSoup
 import csv
+import os
+import queue
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
 
-# Define CSS selectors for various product components
-PRODUCT_LINK_SELECTORS = ['.product-block__image__link', '.grid-product__link', '.product-card__link']
-NAME_SELECTORS = ['.product-title', '.product__title', '.product-single__title', '.product-card__name']
-PRICE_SELECTORS = ['.money', '.price', '.product__price', '.product-card__price']
-DESCRIPTION_SELECTORS = ['.product-description', '.product__description', '.product-single__description']
-COLOR_SELECTOR = "div.swatch__element[data-value], .color-swatch"
-SIZE_SELECTOR = "select[data-single-option-selector] option"
-STOCK_STATUS_SELECTOR = "span[data-add-to-cart-text]"  # Selector for stock status
+from app.crawl_state import CrawlState, body_hash, product_hash
+from app.database_management import create_database, delete_products_by_url, upsert_products
+from app.fetcher import Fetcher
+from app.frontier import Frontier, normalize_url
+from app.page_parser import (
+    DEFAULT_BACKEND, PRODUCT_LINK_SELECTORS, NAME_SELECTORS, PRICE_SELECTORS, DESCRIPTION_SELECTORS,
+    COLOR_SELECTOR, SIZE_SELECTOR, STOCK_STATUS_SELECTOR, ProductParser,
+    get_first_matching_element, get_all_matching_elements, parse_product,
+)
 
+# Outcomes of recrawling one product page
+CHANGED, UNCHANGED, REMOVED, FAILED = "changed", "unchanged", "removed", "failed"
+GONE_STATUSES = {404, 410}
+# Pipelined crawls write products in batches of this size, or whatever has
+# arrived after this many seconds, so early products are searchable quickly
+PIPELINE_BATCH_SIZE = 500
+PIPELINE_FLUSH_SECONDS = 2.0
+CSV_COLUMNS = ["name", "price", "description", "colors", "sizes", "stock_status", "url"]
+# The directory containing the package; the catalog and crawl files live there, wherever the scraper runs from
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATABASE_PATH = os.path.join(BASE_DIR, "ecommerce_products.db")
+CSV_FILE = os.path.join(BASE_DIR, "scraper", "products.csv")
+# Validators and hashes from earlier crawls, kept apart from the catalog the app reads
+STATE_FILE = os.path.join(BASE_DIR, "scraper", "crawl_state.db")
+# Claimed and finished pages of a streamed crawl, for resuming after a crash
+FRONTIER_FILE = os.path.join(BASE_DIR, "scraper", "frontier.db")
+# Product pages are parsed in this many worker processes, leaving a core
+# for the fetch threads; 0 parses in the fetch threads themselves
+PARSE_PROCESSES = max(0, (os.cpu_count() or 1) - 1)
 
-visited_urls = set()  # Track visited URLs to avoid duplication
 
-
-def get_first_matching_element(soup_element, selectors, attribute=None):
-    """Retrieve the first matching element based on a list of CSS selectors."""
-    for selector in selectors:
-        element = soup_element.select_one(selector)
-        if element:
-            return element[attribute].strip() if attribute else element.get_text(strip=True)
-    return "No data available"
-
-
-def get_all_matching_elements(soup, selector, attribute=None):
-    """Retrieve all matching elements based on a CSS selector."""
-    elements = soup.select(selector)
-    return [element[attribute].strip() if attribute else element.get_text(strip=True) for element in elements if element]
+# Track visited URLs to avoid duplication; thread-safe, and normalizes away
+# fragments and tracking parameters
+frontier = Frontier()
+# Pooled keep-alive HTTP client shared by every page fetch; its global and
+# per-host limits, not the thread count, decide how hard a site is hit
+fetcher = Fetcher()
+# Product page parser; lxml with precompiled selectors when it is installed
+parser = ProductParser(DEFAULT_BACKEND, PARSE_PROCESSES)
 
 
 def scrape_product_data(url):
     """Scrape product details from a product page."""
-    if url in visited_urls:
+    url = frontier.claim(url)
+    if url is None:
         return None
-    visited_urls.add(url)
+    return scrape_product_page(url)
+
+
+def scrape_product_page(url):
+    """Fetch and parse one product page, or return None when it cannot be loaded."""
     try:
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, 'html.parser') if response.status_code == 200 else None
-        if not soup:
+        response = fetcher.get(url)
+        if response.status_code != 200:
             print(f"Failed to load page: {url}")
             return None
-
-        # Stock status logic
-        stock_status_element = soup.select_one(STOCK_STATUS_SELECTOR)
-        stock_status = "Unknown"
-        if stock_status_element:
-            stock_text = stock_status_element.get_text(strip=True)
-            if "Add to Cart" in stock_text:
-                stock_status = "In Stock"
-            elif "Sold Out" in stock_text:
-                stock_status = "Out of Stock"
-
-        product = {
-            "name": get_first_matching_element(soup, NAME_SELECTORS),
-            "price": get_first_matching_element(soup, PRICE_SELECTORS),
-            "description": get_first_matching_element(soup, DESCRIPTION_SELECTORS),
-            "colors": ", ".join(get_all_matching_elements(soup, COLOR_SELECTOR, attribute="data-value")),
-            "sizes": ", ".join(get_all_matching_elements(soup, SIZE_SELECTOR)),
-            "stock_status": stock_status,
-            "url": url,
-            
-
-        }
-        return product
+        return parser.parse(response.text, url)
     except Exception as e:
         print(f"Error scraping product page {url}: {e}")
         return None
 
 
+def scrape_product_update(url, state):
+    """Recrawl one product page against its CrawlState entry.
+
+    Returns (CHANGED, product), (UNCHANGED, None), (REMOVED, None) or (FAILED, None).
+    A 304 or a byte-identical body is never parsed, and a page whose extracted
+    fields hash the same as last time counts as unchanged.
+    """
+    try:
+        response = fetcher.get(url, headers=state.conditional_headers(url))
+        if response.status_code == 304:
+            state.touch(url)
+            return UNCHANGED, None
+        if response.status_code in GONE_STATUSES:
+            return REMOVED, None
+        if response.status_code != 200:
+            print(f"Failed to load page: {url}")
+            return FAILED, None
+        entry = state.get(url)
+        page_hash = body_hash(response.content)
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if entry and entry["body_hash"] == page_hash:
+            state.record(url, etag, last_modified, page_hash, entry["product_hash"])
+            return UNCHANGED, None
+        product = parser.parse(response.text, url)
+        fields_hash = product_hash(product)
+        state.record(url, etag, last_modified, page_hash, fields_hash)
+        if entry and entry["product_hash"] == fields_hash:
+            return UNCHANGED, None
+        return CHANGED, product
+    except Exception as e:
+        print(f"Error scraping product page {url}: {e}")
+        return FAILED, None
+
+
 def scrape_collection_page(collection_url):
     """Scrape product links from a collection page."""
+    return scrape_collection_links(collection_url) or []
+
+
+def scrape_collection_links(collection_url):
+    """Product links on a collection page, or None when the page could not be loaded."""
     try:
-        response = requests.get(collection_url)
+        response = fetcher.get(collection_url)
         soup = BeautifulSoup(response.text, 'html.parser') if response.status_code == 200 else None
-        return [collection_url.split('/collections')[0] + a['href'] for a in soup.select(', '.join(PRODUCT_LINK_SELECTORS)) if 'href' in a.attrs] if soup else []
+        return [collection_url.split('/collections')[0] + a['href'] for a in soup.select(', '.join(PRODUCT_LINK_SELECTORS)) if 'href' in a.attrs] if soup else None
     except Exception as e:
         print(f"Error scraping collection page {collection_url}: {e}")
-        return []
+        return None
 
 
 def scrape_all_collections(base_url):
     """Scrape all products from all collections."""
     print("Scraping collections...")
     try:
-        response = requests.get(base_url)
+        response = fetcher.get(base_url)
         soup = BeautifulSoup(response.text, 'html.parser') if response.status_code == 200 else None
         collection_urls = [base_url.rstrip("/") + element['href'] for element in soup.select('a[href^="/collections/"]') if 'href' in element.attrs] if soup else []
         all_product_links = set()
-        with ThreadPoolExecutor(max_workers=10) as executor:
+        with ThreadPoolExecutor(max_workers=fetcher.max_connections) as executor:
             futures = [executor.submit(scrape_collection_page, url) for url in list(set(collection_urls))]
             for future in futures:
                 all_product_links.update(future.result())
         all_products = []
-        with ThreadPoolExecutor(max_workers=10) as executor:
+        with ThreadPoolExecutor(max_workers=fetcher.max_connections) as executor:
             futures = [executor.submit(scrape_product_data, url) for url in all_product_links]
             for future in futures:
                 product = future.result()
@@ -107,14 +144,182 @@ def scrape_all_collections(base_url):
         return []
 
 
-def export_to_csv(products, filename="scraper/products.csv"):
+def scrape_incremental(base_url, state):
+    """Recrawl a shop against a CrawlState and return (changed_products, removed_urls).
+
+    Collection listings are always refetched; product pages go out as
+    conditional GETs and only new or changed products come back. A known URL
+    counts as removed when its page is gone, or when every collection loaded
+    and none of them links to it any more. Links are normalized as in the full
+    crawl, so products, state and removals share the catalog's url keys. The
+    caller saves the state once the changes are stored.
+    """
+    print("Scraping collections...")
+    try:
+        response = fetcher.get(base_url)
+        if response.status_code != 200:
+            print(f"Failed to load page: {base_url}")
+            return [], []
+        soup = BeautifulSoup(response.text, 'html.parser')
+        collection_urls = {base_url.rstrip("/") + element['href'] for element in soup.select('a[href^="/collections/"]') if 'href' in element.attrs}
+        product_links = set()
+        complete = True
+        with ThreadPoolExecutor(max_workers=fetcher.max_connections) as executor:
+            for links in executor.map(scrape_collection_links, collection_urls):
+                if links is None:
+                    complete = False
+                else:
+                    product_links.update(normalize_url(link) for link in links)
+        changed, removed = [], []
+        with ThreadPoolExecutor(max_workers=fetcher.max_connections) as executor:
+            for url, (status, product) in zip(product_links, executor.map(lambda url: scrape_product_update(url, state), product_links)):
+                if status == CHANGED:
+                    changed.append(product)
+                elif status == REMOVED:
+                    removed.append(url)
+        if complete:
+            removed.extend(state.missing(product_links))
+        state.forget(removed)
+        return changed, removed
+    except Exception as e:
+        print(f"Error scraping collections: {e}")
+        return [], []
+
+
+class DatabaseSink:
+    """Pipeline sink that upserts each batch into the products table in its own transaction."""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        create_database(db_file)
+
+    def write(self, products):
+        upsert_products(self.db_file, products)
+
+    def close(self):
+        pass
+
+
+class CSVSink:
+    """Pipeline sink that appends each batch to a CSV export."""
+
+    def __init__(self, filename):
+        self.file = open(filename, mode="w", newline='', encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+        self.writer.writeheader()
+
+    def write(self, products):
+        self.writer.writerows(products)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def _write_batches(products, sink, frontier, batch_size, flush_interval, written):
+    """Drain the product queue into the sink until the None sentinel arrives.
+
+    Pages are only marked done in the frontier once their products are written.
+    """
+    batch = []
+    deadline = None  # when the oldest product in the batch has waited long enough
+    while True:
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            product = products.get(timeout=timeout)
+        except queue.Empty:
+            product = False
+        if product:
+            if not batch:
+                deadline = time.monotonic() + flush_interval
+            batch.append(product)
+            if len(batch) < batch_size:
+                continue
+        if batch:
+            try:
+                sink.write(batch)
+                written[0] += len(batch)
+                frontier.done(product["url"] for product in batch)
+                frontier.checkpoint()
+            except Exception as e:
+                print(f"Error writing {len(batch)} products: {e}")
+            batch = []
+            deadline = None
+        if product is None:
+            return
+
+
+def stream_all_collections(base_url, sink, frontier=None, batch_size=PIPELINE_BATCH_SIZE,
+                           flush_interval=PIPELINE_FLUSH_SECONDS):
+    """Crawl a shop as a pipeline that writes products to `sink` while the crawl runs.
+
+    Product pages are fetched as soon as the collection listing them is parsed,
+    and parsed products go to the sink in batches from a writer thread. The
+    product queue and the number of pages in flight are both bounded; pass a
+    Bloom-filter Frontier to bound the seen URLs too. With a SQLite-backed
+    Frontier opened with resume=True, pages written before a crash or restart
+    are not fetched again. Returns the number of products written.
+    """
+    print("Scraping collections...")
+    frontier = frontier if frontier is not None else Frontier()
+    products = queue.Queue(maxsize=batch_size * 2)
+    written = [0]
+    writer = threading.Thread(target=_write_batches, args=(products, sink, frontier, batch_size, flush_interval, written))
+    writer.start()
+    in_flight = threading.BoundedSemaphore(fetcher.max_connections * 2)
+
+    def fetch_product(url):
+        try:
+            product = scrape_product_page(url)
+            if product:
+                products.put(product)
+        finally:
+            in_flight.release()
+
+    try:
+        response = fetcher.get(base_url)
+        soup = BeautifulSoup(response.text, 'html.parser') if response.status_code == 200 else None
+        collection_urls = {base_url.rstrip("/") + element['href'] for element in soup.select('a[href^="/collections/"]') if 'href' in element.attrs} if soup else set()
+        with ThreadPoolExecutor(max_workers=fetcher.max_connections) as product_executor:
+            def fetch_collection(collection_url):
+                for url in scrape_collection_page(collection_url):
+                    url = frontier.claim(url)
+                    if url is None:
+                        continue
+                    in_flight.acquire()  # backpressure: wait for a free product slot
+                    product_executor.submit(fetch_product, url)
+
+            # Collection workers only parse listings and hand URLs on, so a few are plenty
+            with ThreadPoolExecutor(max_workers=min(4, fetcher.max_connections)) as collection_executor:
+                list(collection_executor.map(fetch_collection, collection_urls))
+    except Exception as e:
+        print(f"Error scraping collections: {e}")
+    finally:
+        products.put(None)
+        writer.join()
+        sink.close()
+    return written[0]
+
+
+def refresh_catalog(base_url, db_file, state_file=STATE_FILE):
+    """Apply an incremental crawl to the catalog database; returns (changed, removed) counts."""
+    state = CrawlState(state_file)
+    changed, removed = scrape_incremental(base_url, state)
+    upsert_products(db_file, changed)
+    delete_products_by_url(db_file, removed)
+    state.save()
+    print(f"{len(changed)} products changed, {len(removed)} removed")
+    return len(changed), len(removed)
+
+
+def export_to_csv(products, filename=CSV_FILE):
     """Export product data to a CSV file."""
     if not products:
         print("No products to export.")
         return
 
     with open(filename, mode="w", newline='', encoding="utf-8") as file:
-        writer = csv.DictWriter(file, fieldnames=["name", "price", "description", "colors", "sizes", "stock_status", "url"])
+        writer = csv.DictWriter(file, fieldnames=CSV_COLUMNS)
         writer.writeheader()
         for product in products:
             writer.writerow({
@@ -131,6 +336,17 @@ def export_to_csv(products, filename="scraper/products.csv"):
 
 
 if __name__ == "__main__":
+    # Run from the directory containing the package: python -m app.scraper
     base_url = input("Enter the base URL of the e-commerce website: ")
-    products = scrape_all_collections(base_url)
-    export_to_csv(products)
+    mode = input("Export a CSV [c], stream into ecommerce_products.db [s] or update it incrementally [i]? ").strip().lower()
+    if mode == "i":
+        refresh_catalog(base_url, DATABASE_PATH)
+    elif mode == "s":
+        resume = input("Resume the previous streamed crawl? [y/N] ").strip().lower() == "y"
+        crawl_frontier = Frontier(FRONTIER_FILE, resume=resume)
+        count = stream_all_collections(base_url, DatabaseSink(DATABASE_PATH), crawl_frontier)
+        crawl_frontier.close()
+        print(f"{count} products written to {DATABASE_PATH} ({crawl_frontier.skipped} finished before the restart)")
+    else:
+        products = scrape_all_collections(base_url)
+        export_to_csv(products)
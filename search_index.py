@@ -0,0 +1,336 @@
+import json
+import os
+import threading
+import time
+from array import array
+from collections import Counter
+
+from fuzzywuzzy import fuzz
+from rapidfuzz import process
+from rapidfuzz.fuzz import partial_ratio as best_partial_ratio
+
+from app.connections import read_connection
+from app.database_management import PRODUCT_COLUMNS, fetch_catalog_version
+from app.metrics import ROWS_SCORED, span
+from app.product_store import ProductStore, TextColumn, open_snapshot, write_snapshot
+
+# A product matches when either field scores above this partial ratio
+MATCH_THRESHOLD = 52
+NGRAM_SIZE = 3
+# Rows SearchIndex.closest fuzzy scores at most
+CLOSEST_POOL = 200
+# Keep each built index in a snapshot file next to the database and map it from there
+SNAPSHOT_INDEX = False
+SNAPSHOT_SUFFIX = ".index"
+
+
+def trigrams(text):
+    """Return the set of character trigrams of a string."""
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def score_product(query, name, description):
+    """Score a product the way the full table scan does, or None if it does not match."""
+    name_match = fuzz.partial_ratio(query, name)
+    description_match = fuzz.partial_ratio(query, description)
+    if name_match > MATCH_THRESHOLD or description_match > MATCH_THRESHOLD:
+        return name_match + description_match
+    return None
+
+
+def rank_products(query, products, limit=None):
+    """Fuzzy score Product rows against a query and return the matches, best first."""
+    query = query.lower()
+    ROWS_SCORED.observe(len(products))
+    matches = []
+    for product in products:
+        score = score_product(query, (product.name or "").lower(), (product.description or "").lower())
+        if score is not None:
+            matches.append((score, product))
+
+    matches.sort(reverse=True, key=lambda match: match[0])
+    if limit is not None:
+        matches = matches[:limit]
+    return [product for _, product in matches]
+
+
+class Postings:
+    """Row offsets containing each trigram, flattened into one array with a start position per gram."""
+
+    def __init__(self, slots, starts, offsets):
+        self.slots = slots       # gram -> slot
+        self.starts = starts     # slot -> start of its offsets, plus one final end
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, texts):
+        """Postings for a column of texts."""
+        grouped = {}
+        for offset, text in enumerate(texts):
+            for gram in trigrams(text):
+                posting = grouped.get(gram)
+                if posting is None:
+                    posting = grouped[gram] = array("I")
+                posting.append(offset)
+        slots, starts, offsets = {}, array("Q", [0]), array("I")
+        while grouped:
+            gram, posting = grouped.popitem()
+            slots[gram] = len(slots)
+            offsets.extend(posting)
+            starts.append(len(offsets))
+        return cls(slots, starts, offsets)
+
+    def get(self, gram):
+        slot = self.slots.get(gram)
+        if slot is None:
+            return None
+        return self.offsets[self.starts[slot]:self.starts[slot + 1]]
+
+    def sections(self, prefix):
+        return {**TextColumn.build(self.slots).sections(f"{prefix}.grams"),
+                f"{prefix}.starts": (self.starts, "Q"), f"{prefix}.offsets": (self.offsets, "I")}
+
+    @classmethod
+    def from_sections(cls, sections, prefix):
+        grams = TextColumn.from_sections(sections, f"{prefix}.grams")
+        return cls({gram: slot for slot, gram in enumerate(grams)}, sections[f"{prefix}.starts"], sections[f"{prefix}.offsets"])
+
+
+class SearchIndex:
+    """Lowercased product names and descriptions, with a character-trigram inverted index over them.
+
+    search() finds every match the full table scan finds, with the same
+    scores and ordering, but fuzzy scores only the rows that can pass the
+    threshold. closest() uses the trigram postings for a bounded-cost lookup.
+    Products live in a columnar ProductStore, and save()/open() put the
+    whole index in a snapshot file that workers memory-map.
+    """
+
+    def __init__(self, products, columns=PRODUCT_COLUMNS, version=None):
+        self.products = products if isinstance(products, ProductStore) else ProductStore.from_rows(products, columns)
+        self.version = version
+        self.names = TextColumn.build([(name or "").lower() for name in self.products.columns["name"]])
+        self.descriptions = TextColumn.build([(text or "").lower() for text in self.products.columns["description"]])
+        self.name_postings = Postings.build(self.names)
+        self.description_postings = Postings.build(self.descriptions)
+
+    def __len__(self):
+        return len(self.products)
+
+    def get(self, product_id):
+        """Return the Product with this id, or None."""
+        return self.products.get(product_id)
+
+    def save(self, path):
+        """Write the index to a snapshot file that open() maps."""
+        kinds, sections = self.products.snapshot_parts()
+        sections.update(self.names.sections("names"))
+        sections.update(self.descriptions.sections("descriptions"))
+        sections.update(self.name_postings.sections("name_postings"))
+        sections.update(self.description_postings.sections("description_postings"))
+        write_snapshot(path, {"version": self.version, "columns": kinds}, sections)
+
+    @classmethod
+    def open(cls, path):
+        """Map an index saved by save(), or return None if there is none.
+
+        Nothing is parsed but the gram directory; rows are read from the
+        mapped file on demand, and processes mapping it share its pages.
+        """
+        snapshot = open_snapshot(path)
+        if snapshot is None:
+            return None
+        header, sections = snapshot
+        index = cls.__new__(cls)
+        index.products = ProductStore.from_snapshot(header["columns"], sections)
+        index.version = header["version"]
+        index.names = TextColumn.from_sections(sections, "names")
+        index.descriptions = TextColumn.from_sections(sections, "descriptions")
+        index.name_postings = Postings.from_sections(sections, "name_postings")
+        index.description_postings = Postings.from_sections(sections, "description_postings")
+        return index
+
+    def candidates(self, query):
+        """Return the row offsets that can match a lowercased query, in table order.
+
+        rapidfuzz's partial_ratio finds the best alignment of the shorter text
+        in the longer, so it never scores below fuzzywuzzy's, which only tries
+        the alignments at its matching blocks. A row it scores at most
+        MATCH_THRESHOLD on both fields cannot match, so none is missed; and
+        it runs in C, several times faster than the scoring it saves.
+        """
+        offsets = set()
+        for texts in (self.names, self.descriptions):
+            offsets.update(offset for _, _, offset in process.extract_iter(
+                query, texts, scorer=best_partial_ratio, score_cutoff=MATCH_THRESHOLD))
+        return sorted(offsets)
+
+    def search(self, query, limit=None):
+        """Return matching products, best score first, optionally only the top `limit`."""
+        query = query.lower()
+        candidates = self.candidates(query)
+        ROWS_SCORED.observe(len(candidates))
+        matches = []
+        for offset in candidates:
+            score = score_product(query, self.names[offset], self.descriptions[offset])
+            if score is not None:
+                matches.append((score, offset))
+
+        matches.sort(reverse=True, key=lambda match: match[0])
+        if limit is not None:
+            matches = matches[:limit]
+        return [self.products[offset] for _, offset in matches]
+
+    def closest(self, query, limit, pool=CLOSEST_POOL, min_name_score=0):
+        """Return up to `limit` matches, best first, fuzzy scoring only the `pool` rows sharing most trigrams.
+
+        A bounded-cost lookup for prompt context: unlike search() it may miss
+        weaker matches, but a vague message costs the same as a precise one.
+        Matches whose name scores below `min_name_score` are dropped.
+        """
+        query = query.lower()
+        counts = Counter()
+        for gram in trigrams(query):
+            for postings in (self.name_postings, self.description_postings):
+                posting = postings.get(gram)
+                if posting:
+                    counts.update(posting)
+        offsets = [offset for offset, _ in counts.most_common(pool)]
+        ROWS_SCORED.observe(len(offsets))
+        matches = []
+        for offset in offsets:
+            score = score_product(query, self.names[offset], self.descriptions[offset])
+            if score is not None:
+                matches.append((score, offset))
+        matches.sort(reverse=True, key=lambda match: match[0])
+        return [self.products[offset] for _, offset in matches[:limit]
+                if fuzz.partial_ratio(query, self.names[offset]) >= min_name_score]
+
+
+# Seconds between catalog version checks; between them requests use what is built
+VERSION_CHECK_SECONDS = 1.0
+# Seconds from the end of one build of a catalog to the start of the next, so a crawl
+# bumping the version every batch costs each worker one rebuild per interval, not one per batch
+REBUILD_INTERVAL_SECONDS = 30.0
+
+
+def catalog_version(database_path):
+    """Return a token that changes whenever the catalog's products change.
+
+    That is the version row ingest bumps, or for a database without one the
+    modification time and size of the file and its write-ahead log; None
+    while the file does not exist.
+    """
+    version = fetch_catalog_version(database_path)
+    if version is not None:
+        return version
+    try:
+        stat = os.stat(database_path)
+    except FileNotFoundError:
+        return None
+    try:
+        wal = os.stat(database_path + "-wal")
+        wal_version = (wal.st_mtime_ns, wal.st_size)
+    except FileNotFoundError:
+        wal_version = None
+    return (stat.st_mtime_ns, stat.st_size, wal_version)
+
+
+class CatalogCache:
+    """One structure built from each catalog, rebuilt on a background thread when the catalog changes.
+
+    `build(database_path, version)` makes the structure. Only the first use
+    of a catalog waits for it. After that, requests keep using the current
+    snapshot while the next one is built beside it; it replaces the old one
+    in a single assignment once complete, so no request waits on a rebuild.
+    Rebuilds start at most once per `rebuild_interval`; changes made in
+    between are picked up together by the next one.
+    """
+
+    def __init__(self, build, check_interval=VERSION_CHECK_SECONDS, rebuild_interval=REBUILD_INTERVAL_SECONDS):
+        self.build = build
+        self.check_interval = check_interval
+        self.rebuild_interval = rebuild_interval
+        self._current = {}     # database path -> (version, structure)
+        self._checked = {}     # database path -> when its version was last checked
+        self._built = {}       # database path -> when its last build finished
+        self._rebuilding = set()
+        self._lock = threading.Lock()
+
+    def get(self, database_path):
+        current = self._current.get(database_path)
+        if current is None:
+            with self._lock:
+                current = self._current.get(database_path)
+                if current is None:
+                    version = catalog_version(database_path)
+                    current = (version, self.build(database_path, version))
+                    self._current[database_path] = current
+                    self._checked[database_path] = self._built[database_path] = time.monotonic()
+            return current[1]
+        now = time.monotonic()
+        if (now - self._checked.get(database_path, 0) >= self.check_interval
+                and now - self._built.get(database_path, 0) >= self.rebuild_interval):
+            self._checked[database_path] = now
+            version = catalog_version(database_path)
+            if version != current[0]:
+                self._start_rebuild(database_path, version)
+        return current[1]
+
+    def _start_rebuild(self, database_path, version):
+        with self._lock:
+            if database_path in self._rebuilding:
+                return
+            self._rebuilding.add(database_path)
+        threading.Thread(target=self._rebuild, args=(database_path, version), name="catalog-reload", daemon=True).start()
+
+    def _rebuild(self, database_path, version):
+        try:
+            self._current[database_path] = (version, self.build(database_path, version))
+        except Exception as e:
+            print(f"Catalog reload failed, still serving the previous one: {e}")
+        finally:
+            with self._lock:
+                self._built[database_path] = time.monotonic()
+                self._rebuilding.discard(database_path)
+
+
+def load_products(database_path):
+    """Read every product row and the column names."""
+    with span("sqlite_read"):
+        cursor = read_connection(database_path).execute("SELECT * FROM products")
+        columns = [column[0] for column in cursor.description]
+        return cursor.fetchall(), columns
+
+
+def build_search_index(database_path, version=None):
+    """Build the index for a catalog version, or with SNAPSHOT_INDEX map its snapshot.
+
+    A snapshot of another version is rebuilt and replaced; requests still
+    using the old mapping keep reading the replaced file until they finish.
+    """
+    snapshot_path = database_path + SNAPSHOT_SUFFIX
+    if SNAPSHOT_INDEX:
+        index = SearchIndex.open(snapshot_path)
+        # The header stores the version as JSON, where tuples come back as lists
+        if index is not None and index.version == json.loads(json.dumps(version)):
+            index.version = version
+            return index
+    products, columns = load_products(database_path)
+    index = SearchIndex(products, columns, version)
+    if SNAPSHOT_INDEX:
+        try:
+            index.save(snapshot_path)
+            index = SearchIndex.open(snapshot_path)
+            index.version = version
+        except OSError as e:
+            print(f"Could not write search index snapshot: {e}")
+    return index
+
+
+_indexes = CatalogCache(build_search_index)
+
+
+def get_search_index(database_path):
+    """Return the search index for a database, rebuilt in the background when its catalog changes."""
+    return _indexes.get(database_path)
@@ -0,0 +1,134 @@
+import argparse
+import gc
+import os
+import signal
+import threading
+
+from werkzeug.serving import make_server
+
+from app import chat, routes, search_index
+from app.connections import close_read_connections
+from app.database_management import create_database, missing_schema
+from app.facets import get_facet_parser
+from app.result_store import History, SQLiteResultStore
+from app.run import app
+from app.search_index import get_search_index
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # gunicorn is POSIX only; without it the app runs as one threaded process
+    BaseApplication = None
+
+DEFAULT_BIND = "127.0.0.1:8000"
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_THREADS = 4
+# Seconds a worker may spend on one request; LLM calls give up after the dispatcher's deadline
+REQUEST_TIMEOUT = 60
+# Seconds in-flight requests get to finish after SIGTERM or SIGINT
+GRACEFUL_TIMEOUT = 30
+# Search results and histories shared by the workers live in this file next to the catalog
+RESULT_STORE_NAME = "result_sets.db"
+
+
+def preload_catalog(database_path):
+    """Load the catalog and its search structures once, in the process that forks the workers.
+
+    Workers inherit them copy-on-write instead of each reading the table.
+    Read connections are closed first, since SQLite handles must not cross
+    a fork, and gc.freeze() keeps the collector from writing to, and so
+    copying, every page of the inherited objects. A mapped index snapshot
+    is shared through the page cache instead, and stays shared under load.
+    A catalog without the current schema is refused rather than migrated,
+    since migrating can delete rows; --migrate does that explicitly.
+    """
+    missing = missing_schema(database_path)
+    if missing:
+        raise SystemExit(f"{database_path} is not an up-to-date catalog (missing {', '.join(missing)}). "
+                         "Run `python -m app.serve --migrate` once to upgrade it; "
+                         "this deletes older rows that share a url with a newer one.")
+    if routes.SEARCH_BACKEND == "index":
+        index = get_search_index(database_path)
+        print(f"Preloaded {len(index)} products")
+    get_facet_parser(database_path)
+    close_read_connections()
+    gc.freeze()
+
+
+def close_worker():
+    """Release a worker's connections and LLM threads once its last request is done."""
+    chat.dispatcher.shutdown(wait=False)
+    close_read_connections()
+
+
+class CatalogServer(BaseApplication if BaseApplication is not None else object):
+    """gunicorn running the preloaded app in `workers` processes of `threads` threads each."""
+
+    def __init__(self, bind, workers, threads):
+        self.options = {
+            "bind": bind,
+            "workers": workers,
+            "threads": threads,
+            "worker_class": "gthread" if threads > 1 else "sync",
+            "preload_app": True,
+            "timeout": REQUEST_TIMEOUT,
+            "graceful_timeout": GRACEFUL_TIMEOUT,
+            "worker_exit": lambda arbiter, worker: close_worker(),
+        }
+        super().__init__()
+
+    def load_config(self):
+        for name, value in self.options.items():
+            self.cfg.set(name, value)
+
+    def load(self):
+        return app
+
+
+def serve_threaded(bind, threads):
+    """One process with a thread per request, for hosts without gunicorn; stops gracefully on SIGTERM or SIGINT."""
+    host, port = bind.rsplit(":", 1)
+    server = make_server(host, int(port), app, threaded=True)
+    server.daemon_threads = False  # so server_close waits for requests still running
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f"Serving on http://{bind} in one process (gunicorn is not installed; --workers and --threads are ignored)")
+    server.serve_forever()
+    server.server_close()
+    close_worker()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the chatbot with a preloaded catalog.")
+    parser.add_argument("--bind", default=DEFAULT_BIND, help="host:port to listen on")
+    parser.add_argument("--db", default=routes.DATABASE_PATH, help="product catalog database")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="worker processes")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS, help="request threads per worker")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="map the search index from a snapshot file next to the database, writing it if stale")
+    parser.add_argument("--migrate", action="store_true",
+                        help="upgrade an older catalog's schema before serving, deleting older rows that share a url")
+    args = parser.parse_args()
+
+    routes.DATABASE_PATH = os.path.abspath(args.db)
+    if args.migrate:
+        create_database(routes.DATABASE_PATH)
+        print(f"Migrated {routes.DATABASE_PATH}")
+    search_index.SNAPSHOT_INDEX = args.snapshot
+    if args.workers > 1:
+        # Search result pages and conversation history must be found by whichever worker gets the next request
+        store_path = os.path.join(os.path.dirname(routes.DATABASE_PATH), RESULT_STORE_NAME)
+        routes.RESULT_STORE = SQLiteResultStore(store_path)
+        routes.HISTORY_STORE = SQLiteResultStore(store_path, table="histories", value_type=History)
+    preload_catalog(routes.DATABASE_PATH)
+    if BaseApplication is None:
+        serve_threaded(args.bind, args.threads)
+    else:
+        CatalogServer(args.bind, args.workers, args.threads).run()
+
+
+if __name__ == "__main__":
+    main()